@@ -0,0 +1,152 @@
+"""Replays live sale and payment events against an ingestor on the mock API.
+
+Every tick emits new sales with their payments, edits and deletes a few
+earlier ones, then polls the feed once. At the end the ingested month is
+checked, as seen from a second session of the same company, against a
+fresh ``/sales`` and ``/payments`` snapshot, and the upstream traffic is
+compared with refetching both endpoints every tick.
+
+Usage: python -m benchmarks.event_replay [ticks] [sales_per_tick]
+"""
+
+import random
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.mock_api import DATETIME_FORMAT, MockAPI
+from helpers import upstream
+from helpers.api import (
+    get_bills_by_ids,
+    get_headers,
+    get_payments,
+    get_sales,
+    get_stock_outs_by_month,
+)
+from helpers.auth import sessions
+from helpers.dre import (
+    get_faturamento_data,
+    get_month_customers,
+    get_month_faturamento,
+    get_month_payments,
+    get_month_sales,
+    get_month_services,
+)
+from helpers.ingest import Ingestor, LiveMonth, register
+from models.enums import ReferenceTable
+
+
+def assert_close(live: dict, fresh: dict):
+    assert live.keys() == fresh.keys()
+    for key, value in fresh.items():
+        if isinstance(value, dict):
+            assert_close(live[key], value)
+        else:
+            assert np.allclose(live[key], value), key
+
+
+def emit_tick(mock: MockAPI, rng: random.Random, month, sales: list, count: int):
+    for _ in range(count):
+        sale = dict(mock.data.sales(month)[0])
+        sale["id"] = 50_000_000 + len(sales)
+        sale["customer"] = rng.randint(1, mock.data.customers)
+        sale["services"] = {str(rng.randint(1, mock.data.services)): 1}
+        sale["value"] = sale["amountPaid"] = round(rng.uniform(10, 500), 2)
+        sale["moment"] = mock.data._moment(rng, month).strftime(DATETIME_FORMAT)
+        sales.append(sale)
+        mock.emit("sale", sale)
+        mock.emit(
+            "payment",
+            {
+                "id": sale["id"],
+                "referenceTable": "3",
+                "referenceId": sale["id"],
+                "value": sale["value"],
+                "paymentMethod": str(rng.randint(1, 4)),
+                "cashRegister": 1,
+                "done": sale["moment"],
+                "userId": 1,
+            },
+        )
+
+    if len(sales) > count:
+        edited = dict(rng.choice(sales))
+        edited["value"] = round(edited["value"] * 1.1, 2)
+        mock.emit("sale", edited)
+        deleted = sales.pop(rng.randrange(len(sales)))
+        mock.emit("sale", {"id": deleted["id"]}, action="delete")
+        mock.emit("payment", {"id": deleted["id"]}, action="delete")
+
+
+def main(ticks: int = 20, sales_per_tick: int = 10):
+    mock = MockAPI().start()
+    upstream.base_url = mock.base_url
+    try:
+        session = sessions.login("usuario", "senha", "1")
+        headers = get_headers(session.company, session.token)
+        month = mock.data._months()[-1]
+        rng = random.Random("replay")
+
+        ingestor = register(Ingestor(month, headers))
+        ingestor.seed()
+        seeded = sum(mock.bytes_sent.values())
+        mock.requests.clear()
+        mock.bytes_sent.clear()
+
+        sales, poll_seconds = [], 0.0
+        for _ in range(ticks):
+            emit_tick(mock, rng, month, sales, sales_per_tick)
+            started = time.perf_counter()
+            ingestor.poll()
+            poll_seconds += time.perf_counter() - started
+        ingest_requests = sum(mock.requests.values())
+        ingest_bytes = sum(mock.bytes_sent.values())
+
+        mock.bytes_sent.clear()
+        sales = get_sales.__wrapped__(month, headers)
+        payments = get_payments.__wrapped__(month, headers)
+        refetch_bytes = sum(mock.bytes_sent.values()) * ticks
+
+        # the mock API accepts any token, which stands in for another user
+        other_headers = get_headers(session.company, "outra-sessao")
+        expected = LiveMonth(month, sales, payments)
+        stock_outs = get_stock_outs_by_month(month, other_headers)
+        bills_to_pay = get_bills_by_ids(
+            [
+                payment.reference_id
+                for payment in payments
+                if payment.reference_table is ReferenceTable.BILLS_TO_PAY
+            ],
+            other_headers,
+            month=month,
+        )
+
+        assert get_month_sales(month, other_headers) == sales
+        assert get_month_payments(month, other_headers) == payments
+        assert_close(
+            get_month_faturamento(month, other_headers),
+            get_faturamento_data(payments, sales, stock_outs, bills_to_pay),
+        )
+        assert_close(
+            get_month_customers(month, other_headers), expected.customers.as_dict()
+        )
+        assert_close(
+            get_month_services(month, other_headers), expected.services.as_dict()
+        )
+
+        print(f"events applied: {ingestor.applied} in {ticks} polls")
+        print(f"seed: {seeded / 1024:.0f} KiB")
+        print(
+            f"ingest: {ingest_requests} requests, {ingest_bytes / 1024:.0f} KiB,"
+            f" {poll_seconds / ticks * 1000:.1f} ms per poll"
+        )
+        print(f"refetch: {2 * ticks} requests, {refetch_bytes / 1024:.0f} KiB")
+        print("every aggregate of the ingested month matches the upstream snapshot")
+    finally:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,72 @@
+"""Measures the cold import cost of each page with ``python -X importtime``.
+
+Only the imports a page runs before it renders anything are measured: its
+module-level imports, excluding those nested in branches such as the heavy
+imports resumo defers until the plan check passes.
+
+Usage: python -m benchmarks.import_time [runs]
+"""
+
+import ast
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGES = ["login.py", "pages/resumo.py"]
+
+
+def top_level_imports(page: str) -> str:
+    tree = ast.parse((ROOT / page).read_text(encoding="utf-8"))
+    return "\n".join(
+        ast.unparse(node)
+        for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    )
+
+
+def import_time(code: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split("|")
+        modules[name.strip()] = (int(self_us.split(":")[-1]), int(cumulative_us))
+    return modules
+
+
+def measure(page: str, runs: int) -> tuple:
+    code = top_level_imports(page)
+    totals, last = [], {}
+    for _ in range(runs):
+        last = import_time(code)
+        totals.append(sum(self_us for self_us, _ in last.values()))
+    return statistics.median(totals), last
+
+
+def main(runs: int = 5):
+    for page in PAGES:
+        total_us, modules = measure(page, runs)
+        heaviest = sorted(
+            (
+                (cumulative, name)
+                for name, (_, cumulative) in modules.items()
+                if "." not in name
+            ),
+            reverse=True,
+        )[:8]
+        print(f"{page}: {total_us / 1000:.0f} ms ({len(modules)} modules)")
+        for cumulative, name in heaviest:
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,188 @@
+"""Drives concurrent simulated dashboard sessions against the mock API.
+
+Each session logs in, renders the resumo page, changes the selected months
+and moves both top-K sliders, timing every render. Reports render latency
+percentiles, upstream requests, the upstream calls saved by single-flight,
+the cache hit rate and size, the concurrency limit and process memory per
+concurrency level.
+
+Caches stay warm across levels, as on a long-running server, unless
+``--cold`` is given.
+
+Usage: python -m benchmarks.load_test [--cold] [concurrency ...]
+"""
+
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from streamlit import config
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import (
+    MemoryCacheStorageManager,
+)
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.testing.v1 import AppTest, app_test
+
+from benchmarks.mock_api import MockAPI
+from helpers import upstream
+from helpers.api import fetch_metrics
+from helpers.cache import cache_store
+
+ROOT = Path(__file__).resolve().parent.parent
+RENDER_TIMEOUT = 120
+
+
+def share_app_test_runtime():
+    """Lets AppTest instances run concurrently in threads.
+
+    AppTest installs a mock Runtime singleton before each run and clears it
+    afterwards, which breaks any other run in flight. Install one shared mock
+    for the whole load test and point AppTest at a detached subclass so its
+    per-run setup and teardown no longer touch the real singleton.
+    """
+
+    class DetachedRuntime(Runtime):
+        pass
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    app_test.Runtime = DetachedRuntime
+    config.set_option("global.appTest", True)
+
+
+def _rss_mib() -> float:
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def _timed(run, timings: list, failures: list):
+    started = time.perf_counter()
+    at = run()
+    timings.append(time.perf_counter() - started)
+    if at.exception:
+        failures.append(at.exception[0].message)
+    return at
+
+
+def session(company: str, timings: list, failures: list):
+    login = AppTest.from_file(str(ROOT / "login.py"), default_timeout=RENDER_TIMEOUT)
+    login.run()
+    login.text_input[0].input("usuario")
+    login.text_input[1].input("senha")
+    login.text_input[2].input(company)
+    _timed(login.run, timings, failures)
+
+    at = AppTest.from_file(
+        str(ROOT / "pages" / "resumo.py"), default_timeout=RENDER_TIMEOUT
+    )
+    at.session_state["company"] = company
+    at.session_state["session_token"] = "mock-token"
+    at.session_state["pseudonym"] = f"Empresa {company}"
+    at.session_state["session_key"] = login.session_state["session_key"]
+    _timed(at.run, timings, failures)
+
+    months = at.multiselect[0]
+    _timed(months.select(months.options[0]).run, timings, failures)
+    _timed(at.slider(key="customers").set_value(50).run, timings, failures)
+    _timed(at.slider(key="items").set_value(30).run, timings, failures)
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def metric_totals() -> dict:
+    metrics = fetch_metrics()
+    namespaces = metrics["cache"]["namespaces"].values()
+
+    return {
+        "saved": sum(
+            flight["coalesced_calls"] for flight in metrics["single_flight"].values()
+        ),
+        "hits": sum(namespace["hits"] for namespace in namespaces),
+        "misses": sum(namespace["misses"] for namespace in namespaces),
+        "cache_mib": metrics["cache"]["bytes"] / 2**20,
+        "limit": metrics["upstream"]["limit"],
+    }
+
+
+def run_level(mock: MockAPI, concurrency: int, companies: int) -> dict:
+    timings, failures = [], []
+    mock.requests.clear()
+    before = metric_totals()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [
+            executor.submit(session, str(index % companies), timings, failures)
+            for index in range(concurrency)
+        ]:
+            future.result()
+    after = metric_totals()
+    lookups = after["hits"] + after["misses"] - before["hits"] - before["misses"]
+
+    return {
+        "concurrency": concurrency,
+        "renders": len(timings),
+        "failures": len(failures),
+        "p50": statistics.median(timings),
+        "p95": percentile(timings, 0.95),
+        "p99": percentile(timings, 0.99),
+        "wall": time.perf_counter() - started,
+        "upstream": sum(mock.requests.values()),
+        "saved": after["saved"] - before["saved"],
+        "hit_rate": (after["hits"] - before["hits"]) / lookups if lookups else 0.0,
+        "cache_mib": after["cache_mib"],
+        "limit": after["limit"],
+        "rss_mib": _rss_mib(),
+    }
+
+
+def main(levels=(1, 2, 4, 8), companies: int = 2, cold: bool = False):
+    share_app_test_runtime()
+    mock = MockAPI().start()
+    upstream.base_url = mock.base_url
+    upstream.COMPANY_RATE = 1_000
+    upstream.COMPANY_BURST = 1_000
+
+    print(
+        f"{'sessions':>8} {'renders':>7} {'fail':>4} {'p50 s':>7} {'p95 s':>7}"
+        f" {'p99 s':>7} {'wall s':>7} {'upstream':>8} {'saved':>5} {'hit %':>5}"
+        f" {'cache MiB':>9} {'limit':>5} {'rss MiB':>8}"
+    )
+    try:
+        for concurrency in levels:
+            if cold:
+                cache_store.clear()
+            result = run_level(mock, concurrency, companies)
+            print(
+                f"{result['concurrency']:>8} {result['renders']:>7}"
+                f" {result['failures']:>4} {result['p50']:>7.2f}"
+                f" {result['p95']:>7.2f} {result['p99']:>7.2f}"
+                f" {result['wall']:>7.2f} {result['upstream']:>8}"
+                f" {result['saved']:>5} {result['hit_rate'] * 100:>5.1f}"
+                f" {result['cache_mib']:>9.1f} {result['limit']:>5.1f}"
+                f" {result['rss_mib']:>8.1f}"
+            )
+    finally:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(
+        tuple(int(arg) for arg in args if arg != "--cold") or (1, 2, 4, 8),
+        cold="--cold" in args,
+    )
@@ -0,0 +1,327 @@
+"""Local stand-in for api.duzzsystem.com.br serving synthetic company data.
+
+Usage: python -m benchmarks.mock_api [port]
+"""
+
+import calendar
+import hashlib
+import json
+import random
+import sys
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+DATETIME_FORMAT = "%d-%m-%Y %H:%M:%S"
+EVENTS_PAGE = 500
+
+
+class MockData:
+    def __init__(
+        self,
+        customers: int = 500,
+        products: int = 200,
+        services: int = 20,
+        sales_per_month: int = 1_000,
+        bills_per_month: int = 30,
+        moves_per_month: int = 2_000,
+        last_month: Optional[date] = None,
+    ):
+        self.customers = customers
+        self.products = products
+        self.services = services
+        self.sales_per_month = sales_per_month
+        self.bills_per_month = bills_per_month
+        self.moves_per_month = moves_per_month
+        self.last_month = last_month or date.today().replace(day=1)
+
+    def _months(self):
+        # the twelve months the resumo page offers, ending at the current one
+        last = self.last_month.year * 12 + self.last_month.month - 1
+        return [
+            date(index // 12, index % 12 + 1, 1) for index in range(last - 11, last + 1)
+        ]
+
+    def _moment(self, rng: random.Random, month: date) -> datetime:
+        days = calendar.monthrange(month.year, month.month)[-1]
+        return datetime(month.year, month.month, 1) + timedelta(
+            seconds=rng.randrange(days * 24 * 60 * 60)
+        )
+
+    def sales(self, month: date) -> list:
+        rng = random.Random(f"sales-{month}")
+        sales = []
+        for index in range(self.sales_per_month):
+            value = round(rng.uniform(10, 500), 2)
+            sales.append(
+                {
+                    "id": month.month * 1_000_000 + index,
+                    "customer": rng.randint(1, self.customers),
+                    "products": {str(rng.randint(1, self.products)): 1},
+                    "services": {str(rng.randint(1, self.services)): 1},
+                    "value": value,
+                    "amountPaid": value,
+                    "plots": {},
+                    "intereset": {},
+                    "increase": 0,
+                    "isClosed": True,
+                    "promotion": "",
+                    "discount": round(rng.uniform(0, 10), 2),
+                    "userId": 1,
+                    "moment": self._moment(rng, month).strftime(DATETIME_FORMAT),
+                    "observation": "",
+                }
+            )
+        return sales
+
+    def bills(self, month: date) -> list:
+        rng = random.Random(f"bills-{month}")
+        return [
+            {
+                "id": month.month * 1_000 + index,
+                "referenceTable": rng.choice(["4", "5"]),
+                "referenceId": index,
+                "value": round(rng.uniform(50, 2_000), 2),
+                "valuePaid": 0,
+                "paid": True,
+                "createdAt": self._moment(rng, month).strftime(DATETIME_FORMAT),
+                "closedAt": None,
+                "dueDate": None,
+            }
+            for index in range(self.bills_per_month)
+        ]
+
+    def payments(self, month: date) -> list:
+        rng = random.Random(f"payments-{month}")
+        payments = [
+            {
+                "id": sale["id"],
+                "referenceTable": "3",
+                "referenceId": sale["id"],
+                "value": sale["value"],
+                "paymentMethod": str(rng.randint(1, 4)),
+                "cashRegister": 1,
+                "done": sale["moment"],
+                "userId": 1,
+            }
+            for sale in self.sales(month)
+        ]
+        payments += [
+            {
+                "id": 10_000_000 + bill["id"],
+                "referenceTable": "6",
+                "referenceId": bill["id"],
+                "value": bill["value"],
+                "paymentMethod": "6",
+                "cashRegister": 1,
+                "done": bill["createdAt"],
+                "userId": 1,
+            }
+            for bill in self.bills(month)
+        ]
+        return payments
+
+    def stocks(self) -> list:
+        rng = random.Random("stocks")
+        moves = {"entries": [], "outs": []}
+        for month in self._months():
+            for direction in moves:
+                for _ in range(self.moves_per_month // 2):
+                    moves[direction].append(
+                        {
+                            "id": len(moves["entries"]) + len(moves["outs"]) + 1,
+                            "productId": str(rng.randint(1, self.products)),
+                            "stockId": 1,
+                            "moment": self._moment(rng, month).isoformat(),
+                            "amount": rng.randint(1, 5),
+                            "value": round(rng.uniform(5, 200), 2),
+                            "userId": "1",
+                        }
+                    )
+        return [
+            {
+                "id": 1,
+                "value": 0,
+                "startDate": self._months()[0].strftime("%d-%m-%Y 00:00:00"),
+                "dueDate": None,
+                "cmv": 0,
+                "entries": {"moves": moves["entries"], "total": 0},
+                "outs": {"moves": moves["outs"], "total": 0},
+            }
+        ]
+
+    def customer(self, customer_id: int) -> dict:
+        return {
+            "id": customer_id,
+            "name": f"Cliente {customer_id}",
+            "lastName": "Teste",
+            "whatsapp": None,
+            "email": None,
+        }
+
+    def service(self, service_id: int) -> dict:
+        return {
+            "id": service_id,
+            "name": f"Serviço {service_id}",
+            "particulars": {},
+            "value": 50,
+        }
+
+    def product(self, product_id: int) -> dict:
+        return {
+            "id": product_id,
+            "name": f"Produto {product_id}",
+            "particulars": {"tamanho": 1},
+            "value": 20,
+        }
+
+
+class MockAPI:
+    """Threaded HTTP server answering the endpoints used by helpers.api.
+
+    ``emit`` records a sale or payment event on the ``/events`` feed and
+    applies it to what ``/sales`` and ``/payments`` return.
+    """
+
+    def __init__(self, data: MockData = None, port: int = 0):
+        self.data = data or MockData()
+        self.requests = Counter()
+        self.bytes_sent = Counter()
+        self.events = []
+        self._overrides = {"sale": {}, "payment": {}}
+        self._lock = threading.Lock()
+        self._bodies = {}
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self) -> "MockAPI":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def emit(self, kind: str, data: dict, action: str = "upsert"):
+        with self._lock:
+            self.events.append({"type": kind, "action": action, "data": data})
+            self._overrides[kind][data["id"]] = None if action == "delete" else data
+            self._bodies = {
+                key: value
+                for key, value in self._bodies.items()
+                if key[0] not in ("/sales", "/payments")
+            }
+
+    def _merged(self, kind: str, items: list, month: date, moment: str) -> list:
+        overrides = self._overrides[kind]
+        merged = [overrides.get(item["id"], item) for item in items]
+        known = {item["id"] for item in items}
+        merged += [
+            item
+            for item_id, item in overrides.items()
+            if item_id not in known
+            and item is not None
+            and datetime.strptime(item[moment], DATETIME_FORMAT).date().replace(day=1)
+            == month
+        ]
+        return [item for item in merged if item is not None]
+
+    def _events(self, query: dict) -> dict:
+        if "cursor" not in query:
+            return {"events": [], "cursor": len(self.events)}
+        cursor = int(query["cursor"])
+        events = self.events[cursor : cursor + EVENTS_PAGE]
+        return {"events": events, "cursor": cursor + len(events)}
+
+    def _body(self, path: str, query: dict):
+        data = self.data
+        month = None
+        if "startRange" in query:
+            month = date.fromisoformat(query["startRange"]).replace(day=1)
+        item_id = int(query["id"]) if "id" in query else None
+
+        if path == "/auth/user":
+            return {
+                "sessionToken": "mock-token",
+                "companyData": {"pseudonimo": f"Empresa {query.get('company')}"},
+            }
+        if path == "/sales":
+            return self._merged("sale", data.sales(month), month, "moment")
+        if path == "/payments":
+            return self._merged("payment", data.payments(month), month, "done")
+        if path == "/stock":
+            return data.stocks()
+        if path == "/bills-to-pay":
+            months = [month] if month else data._months()
+            bills = [bill for month in months for bill in data.bills(month)]
+            if item_id is not None:
+                bills = [bill for bill in bills if bill["id"] == item_id]
+            return bills or None
+        if path == "/customers":
+            return [data.customer(item_id)]
+        if path == "/services":
+            return [data.service(item_id)]
+        if path == "/products":
+            return [data.product(item_id)]
+
+        return None
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                with api._lock:
+                    api.requests[url.path] += 1
+
+                    cache_key = (url.path, tuple(sorted(query.items())))
+                    if url.path == "/events":
+                        body = json.dumps(api._events(query)).encode()
+                        etag = None
+                    elif cache_key in api._bodies:
+                        body, etag = api._bodies[cache_key]
+                    else:
+                        payload = api._body(url.path, query)
+                        body = None if payload is None else json.dumps(payload).encode()
+                        etag = body and f'"{hashlib.sha1(body).hexdigest()}"'
+                        api._bodies[cache_key] = (body, etag)
+
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                if etag and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+
+                with api._lock:
+                    api.bytes_sent[url.path] += len(body)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    api = MockAPI(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8000)
+    print(f"Mock API on {api.base_url}")
+    api.server.serve_forever()
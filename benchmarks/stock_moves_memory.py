@@ -0,0 +1,75 @@
+"""Compares the memory held by the Stock model tree and StockMovesTable.
+
+Usage: python -m benchmarks.stock_moves_memory [stocks] [moves_per_stock]
+"""
+import gc
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+from helpers.stock_moves import StockMovesTable
+from models.stocks import Stock, StockEntries, StockMoves, StockOuts
+
+
+def build_stocks(stocks: int, moves_per_stock: int):
+    start = datetime(2020, 1, 1)
+    move_id = 0
+
+    def moves(stock_id: int, count: int):
+        nonlocal move_id
+        for _ in range(count):
+            move_id += 1
+            yield StockMoves(
+                id=move_id,
+                product_id=str(random.randint(1, 5_000)),
+                stock_id=stock_id,
+                moment=start + timedelta(minutes=random.randint(0, 2_000_000)),
+                amount=random.randint(1, 10),
+                value=round(random.uniform(1, 500), 2),
+                user_id=str(random.randint(1, 20)),
+            )
+
+    return [
+        Stock(
+            id=stock_id,
+            value=0,
+            start_date=start,
+            cogs=0,
+            entries=StockEntries(
+                moves=list(moves(stock_id, moves_per_stock // 2)), total=0
+            ),
+            outs=StockOuts(moves=list(moves(stock_id, moves_per_stock // 2)), total=0),
+        )
+        for stock_id in range(1, stocks + 1)
+    ]
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return value, size
+
+
+def main(stocks: int = 50, moves_per_stock: int = 4_000):
+    random.seed(0)
+    tree, tree_size = measure(lambda: build_stocks(stocks, moves_per_stock))
+    table, table_size = measure(lambda: StockMovesTable.from_stocks(tree))
+    moves = len(table)
+
+    print(f"moves:          {moves}")
+    print(f"model tree:     {tree_size / 2**20:8.2f} MiB ({tree_size / moves:.1f} B/move)")
+    print(
+        f"columnar table: {table_size / 2**20:8.2f} MiB ({table_size / moves:.1f} B/move)"
+    )
+    print(f"table arrays:   {table.nbytes / 2**20:8.2f} MiB")
+    print(f"ratio:          {tree_size / table_size:8.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
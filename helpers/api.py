@@ -1,65 +1,83 @@
 import calendar
 from datetime import date
 from functools import lru_cache
-from typing import List, Union
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, Union
 import requests as rq
 
+from helpers.auth import MAX_SESSIONS, authenticate, get_token, sessions
+from helpers.cache import cache_stats, swr_cache
+from helpers import upstream
 from models.bills import Bills
 from models.customers import Customer
 from models.payments import Payment
 from models.sales import Product, Sale, Service
 from models.stocks import Stock
-import cachetools.func
+from cachetools.keys import hashkey
 
+if TYPE_CHECKING:
+    from helpers.stock_moves import StockMovesTable
 
-base_url = "https://api.duzzsystem.com.br"
+CACHE_TTL = 10 * 60
+CACHE_MAX_STALE = 60 * 60
 
 
-@lru_cache
-def get_token(username: str, password: str, company: str):
-    user_data = rq.get(
-        base_url + "/auth/user",
-        params={"username": username, "password": password, "company": company},
+def company_key(*args, **kwargs):
+    return hashkey(
+        *(dict(arg)["company"] if isinstance(arg, tuple) else arg for arg in args),
+        **kwargs,
     )
-    user_data.raise_for_status()
-    user_data = user_data.json()
 
-    return user_data["sessionToken"], user_data["companyData"]["pseudonimo"]
 
-
-@lru_cache
+@lru_cache(maxsize=MAX_SESSIONS)
 def get_headers(company: str, session_token: str) -> tuple:
     return (("company", company), ("sessionToken", session_token))
 
 
-@cachetools.func.ttl_cache(maxsize=128, ttl=10 * 60)
-def get_stocks(headers: tuple) -> List[Stock]:
+@swr_cache(ttl=CACHE_TTL, max_stale=CACHE_MAX_STALE, flight_key=company_key)
+def get_stocks(headers: tuple) -> Tuple[List[Stock], "StockMovesTable"]:
+    from helpers.stock_moves import StockMovesTable
+
     parameters = {"withMoves": True}
 
-    stocks_list = rq.get(
-        base_url + "/stock",
+    def parse(stocks_list: rq.Response) -> Tuple[List[Stock], "StockMovesTable"]:
+        if stocks_list.status_code == 404:
+            stocks_list = []
+        else:
+            stocks_list.raise_for_status()
+            stocks_list = stocks_list.json()
+
+        stock_moves = StockMovesTable.from_payload(stocks_list)
+        stocks = [
+            Stock.from_table(
+                stock_moves,
+                (
+                    (stock.get("entries") or {}).get("total", 0),
+                    (stock.get("outs") or {}).get("total", 0),
+                ),
+                id=stock["id"],
+                value=stock["value"],
+                start_date=Stock.parse_date(stock["startDate"]),
+                due_date=Stock.parse_date(stock["dueDate"]),
+                cogs=stock["cmv"],
+            )
+            for stock in stocks_list
+        ]
+
+        return stocks, stock_moves
+
+    return upstream.get_parsed(
+        upstream.base_url + "/stock",
+        parse,
         params=parameters,
         headers=dict(headers),
     )
 
-    if stocks_list.status_code == 404:
-        stocks_list = []
-    else:
-        stocks_list.raise_for_status()
-        stocks_list = stocks_list.json()
-
-    for stock in stocks_list:
-        stock["startDate"] = Stock.parse_date(stock["startDate"])
-        stock["dueDate"] = Stock.parse_date(stock["dueDate"])
-        stock["cogs"] = stock["cmv"]
 
-    return [Stock(**stock) for stock in stocks_list]
-
-
-@cachetools.func.ttl_cache(maxsize=128, ttl=10 * 60)
+@swr_cache(ttl=CACHE_TTL, max_stale=0)
 def get_stock_by_month(month: date, headers: tuple) -> List[Union[Stock,]]:
     filtered_stocks = []
-    for stock in get_stocks(headers):
+    stocks, _ = get_stocks(headers)
+    for stock in stocks:
         if (
             stock.due_date
             and (
@@ -73,10 +91,35 @@ def get_stock_by_month(month: date, headers: tuple) -> List[Union[Stock,]]:
     return filtered_stocks
 
 
-@cachetools.func.ttl_cache(maxsize=128, ttl=10 * 60)
+def get_stock_moves(headers: tuple) -> "StockMovesTable":
+    _, stock_moves = get_stocks(headers)
+
+    return stock_moves
+
+
+@swr_cache(ttl=CACHE_TTL, max_stale=0)
+def get_stock_outs_by_month(month: date, headers: tuple) -> "StockMovesTable":
+    from helpers.stock_moves import OUT
+
+    stock_moves = get_stock_moves(headers)
+    stock_ids = [stock.id for stock in get_stock_by_month(month, headers)]
+
+    return stock_moves.select(
+        stock_moves.between(
+            month,
+            month.replace(day=calendar.monthrange(month.year, month.month)[-1]),
+            direction=OUT,
+            stock_ids=stock_ids,
+        )
+    )
+
+
+@swr_cache(ttl=CACHE_TTL, max_stale=CACHE_MAX_STALE, flight_key=company_key)
 def get_product_data(headers: tuple, product_id: int) -> Product:
     parameters = {"id": product_id}
-    response = rq.get(base_url + "/products", params=parameters, headers=dict(headers))
+    response = upstream.get(
+        upstream.base_url + "/products", params=parameters, headers=dict(headers)
+    )
     if response.status_code == 404:
         return {}
     response.raise_for_status()
@@ -91,10 +134,12 @@ def get_product_data(headers: tuple, product_id: int) -> Product:
     return product_data
 
 
-@cachetools.func.ttl_cache(maxsize=128, ttl=10 * 60)
+@swr_cache(ttl=CACHE_TTL, max_stale=CACHE_MAX_STALE, flight_key=company_key)
 def get_service_data(service_id: int, headers: tuple) -> Service:
     parameters = {"id": service_id}
-    response = rq.get(base_url + "/services", params=parameters, headers=dict(headers))
+    response = upstream.get(
+        upstream.base_url + "/services", params=parameters, headers=dict(headers)
+    )
     if response.status_code == 404:
         return {}
     response.raise_for_status()
@@ -109,11 +154,13 @@ def get_service_data(service_id: int, headers: tuple) -> Service:
     return service_data
 
 
-@cachetools.func.ttl_cache(maxsize=128, ttl=10 * 60)
+@swr_cache(ttl=CACHE_TTL, max_stale=CACHE_MAX_STALE, flight_key=company_key)
 def get_customer_data(customer_id: int, headers: tuple) -> Customer:
     headers = dict(headers)
     parameters = {"id": customer_id}
-    response = rq.get(base_url + "/customers", params=parameters, headers=headers)
+    response = upstream.get(
+        upstream.base_url + "/customers", params=parameters, headers=headers
+    )
     if response.status_code == 404:
         return []
 
@@ -123,39 +170,43 @@ def get_customer_data(customer_id: int, headers: tuple) -> Customer:
     return Customer(**customer_data)
 
 
-@cachetools.func.ttl_cache(maxsize=128, ttl=10 * 60)
+def parse_sale(sale_data: dict) -> Sale:
+    return Sale(**{**sale_data, "moment": Sale.parse_moment(sale_data["moment"])})
+
+
+def parse_payment(payment_data: dict) -> Payment:
+    return Payment(**{**payment_data, "done": Payment.parse_done(payment_data["done"])})
+
+
+@swr_cache(ttl=CACHE_TTL, max_stale=CACHE_MAX_STALE, flight_key=company_key)
 def get_sales(month: date, headers: tuple) -> List[Sale]:
     parameters = {
         "startRange": month.replace(day=1),
         "endRange": month.replace(day=calendar.monthrange(month.year, month.month)[-1]),
     }
 
-    sales_data = rq.get(
-        base_url + "/sales",
+    sales_data = upstream.get(
+        upstream.base_url + "/sales",
         params=parameters,
         headers=dict(headers),
     )
 
     if sales_data.status_code == 404:
         return []
+    sales_data.raise_for_status()
 
-    sales_data = sales_data.json()
-
-    for sale in sales_data:
-        sale["moment"] = Sale.parse_moment(sale["moment"])
+    return [parse_sale(sale) for sale in sales_data.json()]
 
-    return [Sale(**sale) for sale in sales_data]
 
-
-@cachetools.func.ttl_cache(maxsize=128, ttl=10 * 60)
+@swr_cache(ttl=CACHE_TTL, max_stale=CACHE_MAX_STALE, flight_key=company_key)
 def get_payments(month: date, headers: tuple) -> List[Payment]:
     parameters = {
         "startRange": month.replace(day=1),
         "endRange": month.replace(day=calendar.monthrange(month.year, month.month)[-1]),
     }
 
-    payments_data = rq.get(
-        base_url + "/payments",
+    payments_data = upstream.get(
+        upstream.base_url + "/payments",
         params=parameters,
         headers=dict(headers),
     )
@@ -163,29 +214,120 @@ def get_payments(month: date, headers: tuple) -> List[Payment]:
     if payments_data.status_code == 404:
         payments_data = []
     else:
+        payments_data.raise_for_status()
         payments_data = payments_data.json()
 
-    for payment in payments_data:
-        payment["done"] = Payment.parse_done(payment["done"])
+    return [parse_payment(payment) for payment in payments_data]
+
+
+@swr_cache(ttl=CACHE_TTL, max_stale=0)
+def check_bills_access(headers: tuple):
+    response = upstream.get(
+        upstream.base_url + "/bills-to-pay", params={"id": 0}, headers=dict(headers)
+    )
+    if response.status_code != 404:
+        response.raise_for_status()
+
+
+def parse_bill(bill_data: dict) -> Bills:
+    return Bills(
+        **{
+            **bill_data,
+            "createdAt": Bills.parse_datetime(bill_data["createdAt"]),
+            "closedAt": Bills.parse_datetime(bill_data["closedAt"]),
+            "dueDate": Bills.parse_datetime(bill_data["dueDate"]),
+        }
+    )
+
+
+@swr_cache(ttl=CACHE_TTL, max_stale=CACHE_MAX_STALE, flight_key=company_key)
+def get_bill(bill_id: int, headers: tuple) -> Optional[Bills]:
+    parameters = {"id": bill_id}
+    response = upstream.get(
+        upstream.base_url + "/bills-to-pay", params=parameters, headers=dict(headers)
+    )
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+
+    return parse_bill(response.json()[0])
+
+
+@swr_cache(ttl=CACHE_TTL, max_stale=CACHE_MAX_STALE, flight_key=company_key)
+def get_bills_by_month(month: date, headers: tuple) -> List[Bills]:
+    parameters = {
+        "startRange": month.replace(day=1),
+        "endRange": month.replace(day=calendar.monthrange(month.year, month.month)[-1]),
+    }
 
-    return [Payment(**payment) for payment in payments_data]
+    def parse(bills_data: rq.Response) -> List[Bills]:
+        if bills_data.status_code == 404:
+            return []
+        bills_data.raise_for_status()
 
+        return [parse_bill(bill) for bill in bills_data.json()]
 
-@cachetools.func.ttl_cache(maxsize=128, ttl=10 * 60)
-def get_bills(headers: tuple):
-    bills_data = rq.get(
-        base_url + "/bills-to-pay",
+    bills = upstream.get_parsed(
+        upstream.base_url + "/bills-to-pay",
+        parse,
+        params=parameters,
         headers=dict(headers),
     )
+    for bill in bills:
+        get_bill.cache_set(bill, bill.id, headers)
 
-    if bills_data.status_code == 404:
-        bills_data = []
-    else:
-        bills_data = bills_data.json()
+    return bills
+
+
+def get_bills_by_ids(
+    bill_ids: Iterable[int], headers: tuple, month: Optional[date] = None
+) -> Dict[int, Bills]:
+    bill_ids = set(bill_ids)
+    bills = {}
+    if month is not None and bill_ids:
+        bills = {
+            bill.id: bill
+            for bill in get_bills_by_month(month, headers)
+            if bill.id in bill_ids
+        }
+    for bill_id in bill_ids - bills.keys():
+        bill = get_bill(bill_id, headers)
+        if bill is not None:
+            bills[bill_id] = bill
+
+    return bills
+
+
+def get_events(cursor: Optional[int], headers: tuple) -> rq.Response:
+    parameters = {} if cursor is None else {"cursor": cursor}
 
-    for bill_to_pay in bills_data:
-        bill_to_pay["createdAt"] = Bills.parse_datetime(bill_to_pay["createdAt"])
-        bill_to_pay["closedAt"] = Bills.parse_datetime(bill_to_pay["closedAt"])
-        bill_to_pay["dueDate"] = Bills.parse_datetime(bill_to_pay["dueDate"])
+    return upstream.get(
+        upstream.base_url + "/events", params=parameters, headers=dict(headers)
+    )
+
+
+def single_flight_stats() -> dict:
+    return {
+        fetcher.__name__: fetcher.single_flight.stats()
+        for fetcher in (
+            get_stocks,
+            get_product_data,
+            get_service_data,
+            get_customer_data,
+            get_sales,
+            get_payments,
+            get_bill,
+            get_bills_by_month,
+        )
+    }
 
-    return [Bills(**bill) for bill in bills_data]
+
+def fetch_metrics() -> dict:
+    from helpers.ingest import ingest_stats
+
+    return {
+        "cache": cache_stats(),
+        "single_flight": single_flight_stats(),
+        "upstream": upstream.upstream_stats(),
+        "ingest": ingest_stats(),
+    }
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import cachetools
+
+from helpers import upstream
+
+SESSION_TTL = 12 * 60 * 60
+CREDENTIALS_TTL = 2 * 60 * 60
+MAX_SESSIONS = 1024
+
+_salt = os.urandom(16)
+
+
+def credential_key(username: str, password: str, company: str) -> str:
+    return hashlib.sha256(
+        _salt + "\0".join((username, password, company)).encode()
+    ).hexdigest()
+
+
+class Session:
+    def __init__(
+        self,
+        key: str,
+        company: str,
+        token: str,
+        pseudonym: str,
+        credentials: Tuple[str, str, str],
+        credentials_expire_at: float,
+    ):
+        self.key = key
+        self.company = company
+        self.token = token
+        self.pseudonym = pseudonym
+        self.remember(credentials, credentials_expire_at)
+
+    def remember(self, credentials: Tuple[str, str, str], expire_at: float):
+        self._credentials = credentials
+        self.credentials_expire_at = expire_at
+
+    def credentials(self) -> Optional[Tuple[str, str, str]]:
+        if time.monotonic() >= self.credentials_expire_at:
+            self._credentials = None
+
+        return self._credentials
+
+
+class SessionManager:
+    """Bounded TTL cache of upstream sessions keyed by a credential hash.
+
+    Logins reuse the cached token, which only changes when
+    ``reauthenticate`` replaces it after the API rejects it, so the caches
+    keyed by it stay warm. The credentials needed for that are only kept
+    for ``credentials_ttl`` after the user last typed them; afterwards a
+    rejected token sends the user back to the login page. Sessions unused
+    for ``session_ttl`` are dropped.
+    """
+
+    def __init__(
+        self,
+        authenticate: Callable[[str, str, str], Tuple[str, str]],
+        maxsize: int = MAX_SESSIONS,
+        session_ttl: float = SESSION_TTL,
+        credentials_ttl: float = CREDENTIALS_TTL,
+    ):
+        self._authenticate = authenticate
+        self.credentials_ttl = credentials_ttl
+        self._sessions = cachetools.TTLCache(maxsize=maxsize, ttl=session_ttl)
+        self._lock = threading.Lock()
+
+    def _open(
+        self,
+        key: str,
+        credentials: Tuple[str, str, str],
+        credentials_expire_at: float,
+    ) -> Session:
+        token, pseudonym = self._authenticate(*credentials)
+        session = Session(
+            key=key,
+            company=credentials[2],
+            token=token,
+            pseudonym=pseudonym,
+            credentials=credentials,
+            credentials_expire_at=credentials_expire_at,
+        )
+        with self._lock:
+            self._sessions[key] = session
+
+        return session
+
+    def _get(self, key: str) -> Optional[Session]:
+        with self._lock:
+            for other in self._sessions.values():
+                other.credentials()
+            session = self._sessions.get(key)
+            if session is not None:
+                # touching the entry renews its TTL
+                self._sessions[key] = session
+
+        return session
+
+    def login(self, username: str, password: str, company: str) -> Session:
+        key = credential_key(username, password, company)
+        credentials = (username, password, company)
+        credentials_expire_at = time.monotonic() + self.credentials_ttl
+        session = self._get(key)
+        if session is not None:
+            session.remember(credentials, credentials_expire_at)
+            return session
+
+        return self._open(key, credentials, credentials_expire_at)
+
+    def token(self, key: str) -> Optional[str]:
+        session = self._get(key)
+
+        return session.token if session is not None else None
+
+    def reauthenticate(self, key: str) -> Optional[str]:
+        session = self._get(key)
+        credentials = session.credentials() if session is not None else None
+        if credentials is None:
+            return None
+
+        return self._open(key, credentials, session.credentials_expire_at).token
+
+    def logout(self, key: str):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+
+def authenticate(username: str, password: str, company: str) -> Tuple[str, str]:
+    user_data = upstream.get(
+        upstream.base_url + "/auth/user",
+        params={"username": username, "password": password, "company": company},
+    )
+    user_data.raise_for_status()
+    user_data = user_data.json()
+
+    return user_data["sessionToken"], user_data["companyData"]["pseudonimo"]
+
+
+sessions = SessionManager(authenticate)
+
+
+def get_token(username: str, password: str, company: str) -> Tuple[str, str]:
+    session = sessions.login(username, password, company)
+
+    return session.token, session.pseudonym
@@ -0,0 +1,69 @@
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from models.sales import Sale
+
+MINUTES_PER_DAY = 24 * 60
+
+Period = Tuple[Tuple[int, int], Tuple[int, int]]
+
+
+def sale_moments(sales: List[Sale]) -> Tuple[np.ndarray, np.ndarray]:
+    moments = np.array([sale.moment for sale in sales], dtype="datetime64[m]")
+    values = np.array([sale.value + sale.discount for sale in sales], dtype=float)
+
+    return moments, values
+
+
+def _split_moments(moments: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    days = moments.astype("datetime64[D]")
+    minute_of_day = (moments - days).astype(np.int64)
+    # 1970-01-01 was a Thursday; weekday 0 is Monday as in datetime.weekday()
+    weekday = (days.astype(np.int64) + 3) % 7
+
+    return weekday, minute_of_day
+
+
+def weekday_hour_histogram(moments: np.ndarray, values: np.ndarray) -> np.ndarray:
+    weekday, minute_of_day = _split_moments(moments)
+
+    return np.bincount(
+        weekday * 24 + minute_of_day // 60, weights=values, minlength=7 * 24
+    ).reshape(7, 24)
+
+
+def moment_bin(moment: datetime) -> Tuple[int, int]:
+    return moment.weekday(), moment.hour * 60 + moment.minute
+
+
+def _period_mask(period: Period) -> np.ndarray:
+    (start_hour, start_minute), (end_hour, end_minute) = period
+    start = start_hour * 60 + start_minute
+    end = end_hour * 60 + end_minute
+    minutes = np.arange(MINUTES_PER_DAY)
+    if start <= end:
+        return (minutes >= start) & (minutes <= end)
+
+    return (minutes >= start) | (minutes <= end)
+
+
+def minute_period_totals(
+    by_minute: np.ndarray, periods: Dict[str, Period]
+) -> Dict[str, float]:
+    # periods may overlap; a sale counts towards every period it falls in
+    return {
+        name: float(by_minute[_period_mask(period)].sum())
+        for name, period in periods.items()
+    }
+
+
+def period_totals(
+    moments: np.ndarray, values: np.ndarray, periods: Dict[str, Period]
+) -> Dict[str, float]:
+    _, minute_of_day = _split_moments(moments)
+
+    return minute_period_totals(
+        np.bincount(minute_of_day, weights=values, minlength=MINUTES_PER_DAY), periods
+    )
@@ -0,0 +1,287 @@
+import functools
+import logging
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Union
+
+from cachetools.keys import hashkey
+
+from helpers.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="swr")
+
+CACHE_MEMORY_BUDGET = 512 * 2**20
+SIZE_SAMPLE = 100
+
+
+def approximate_size(value: Any, _seen: Optional[set] = None) -> int:
+    """Estimates the bytes held by ``value`` and everything it references.
+
+    NumPy arrays count their buffers, objects their ``__dict__`` and slots,
+    and large sequences are extrapolated from a sample of ``SIZE_SAMPLE`` items.
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int) and not hasattr(value, "__dict__"):
+        return size + nbytes
+
+    if isinstance(value, dict):
+        items = [item for pair in value.items() for item in pair]
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value)
+    elif hasattr(value, "__dict__"):
+        items = [vars(value)] + [
+            getattr(value, slot, None)
+            for cls in type(value).__mro__
+            for slot in getattr(cls, "__slots__", ())
+            if slot not in ("__dict__", "__weakref__")
+        ]
+    else:
+        return size
+
+    if len(items) > SIZE_SAMPLE:
+        sample = sum(
+            approximate_size(item, seen) for item in random.sample(items, SIZE_SAMPLE)
+        )
+        return size + sample * len(items) // SIZE_SAMPLE
+
+    return size + sum(approximate_size(item, seen) for item in items)
+
+
+class SizedStore:
+    """LRU store shared by every cached fetcher under one memory budget.
+
+    Entries are namespaced by fetcher and sized with ``approximate_size``;
+    the least recently used entries of any namespace are evicted while the
+    total exceeds ``budget``. Entries holding the same ``shared`` object are
+    charged for it once: its size stays on one of them until the last one
+    goes.
+    """
+
+    def __init__(self, budget: int = CACHE_MEMORY_BUDGET):
+        self.budget = budget
+        self.size = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._holders: Dict[int, Set[tuple]] = {}
+        self._stats: dict = {}
+        self._lock = threading.RLock()
+
+    def _namespace_stats(self, namespace: str) -> dict:
+        try:
+            return self._stats[namespace]
+        except KeyError:
+            stats = self._stats[namespace] = {
+                "entries": 0,
+                "bytes": 0,
+                "hits": 0,
+                "misses": 0,
+                "evictions": 0,
+            }
+            return stats
+
+    def _charge(self, key, size: int) -> None:
+        value, _, shared = self._entries[key]
+        self._entries[key] = (value, size, shared)
+        self._namespace_stats(key[0])["bytes"] += size
+
+    def _remove(self, key) -> None:
+        _, size, shared = self._entries.pop(key)
+        stats = self._namespace_stats(key[0])
+        stats["entries"] -= 1
+        stats["bytes"] -= size
+        if shared is not None:
+            holders = self._holders[shared]
+            holders.discard(key)
+            if not holders:
+                del self._holders[shared]
+            elif size:
+                self._charge(next(iter(holders)), size)
+                return
+        self.size -= size
+
+    def peek(self, namespace: str, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+
+        return entry[0] if entry is not None else None
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            stats = self._namespace_stats(namespace)
+            if entry is None:
+                stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end((namespace, key))
+            stats["hits"] += 1
+
+            return entry[0]
+
+    def set(
+        self,
+        namespace: str,
+        key: Hashable,
+        value: Any,
+        size: Union[int, Callable[[], int]],
+        shared: Any = None,
+    ) -> None:
+        """Stores ``value``; ``size`` may be a callable, only called when
+        ``shared`` is not already charged to another entry."""
+        with self._lock:
+            full_key = (namespace, key)
+            if full_key in self._entries:
+                self._remove(full_key)
+
+            shared = None if shared is None else id(shared)
+            if shared in self._holders:
+                size = 0
+            else:
+                size = size() if callable(size) else size
+                if size > self.budget:
+                    return
+
+            self._entries[full_key] = (value, size, shared)
+            if shared is not None:
+                self._holders.setdefault(shared, set()).add(full_key)
+            stats = self._namespace_stats(namespace)
+            stats["entries"] += 1
+            stats["bytes"] += size
+            self.size += size
+
+            while self.size > self.budget:
+                evicted = next(iter(self._entries))
+                self._remove(evicted)
+                self._namespace_stats(evicted[0])["evictions"] += 1
+
+    def pop(self, namespace: str, key: Hashable) -> None:
+        with self._lock:
+            if (namespace, key) in self._entries:
+                self._remove((namespace, key))
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if namespace in (None, key[0])]:
+                self._remove(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "budget": self.budget,
+                "bytes": self.size,
+                "namespaces": {
+                    namespace: {
+                        **stats,
+                        "hit_rate": (
+                            stats["hits"] / (stats["hits"] + stats["misses"])
+                            if stats["hits"] + stats["misses"]
+                            else 0.0
+                        ),
+                    }
+                    for namespace, stats in self._stats.items()
+                },
+            }
+
+
+cache_store = SizedStore()
+
+
+def swr_cache(
+    ttl: float = 10 * 60,
+    max_stale: float = 60 * 60,
+    flight_key: Callable = hashkey,
+    store: SizedStore = cache_store,
+):
+    """Stale-while-revalidate variant of ``cachetools.func.ttl_cache``.
+
+    Values younger than ``ttl`` are served as usual. Expired values younger
+    than ``ttl + max_stale`` are served immediately while a background worker
+    refreshes them; only missing or too-stale entries block the caller.
+    Concurrent fetches whose ``flight_key`` match share one upstream call.
+    Values live in ``store``, which bounds the memory of all fetchers.
+    """
+
+    def decorator(func):
+        namespace = func.__qualname__
+        refreshing = set()
+        lock = threading.Lock()
+        flight = SingleFlight()
+
+        def fetch(args, kwargs):
+            return flight.do(flight_key(*args, **kwargs), func, *args, **kwargs)
+
+        def save(key, value):
+            store.set(
+                namespace,
+                key,
+                (value, time.monotonic(), datetime.now()),
+                lambda: approximate_size(value),
+                shared=value,
+            )
+
+        def refresh(key, args, kwargs):
+            try:
+                save(key, fetch(args, kwargs))
+            except Exception:
+                logger.exception("Background refresh of %s failed", func.__name__)
+            finally:
+                with lock:
+                    refreshing.discard(key)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = hashkey(*args, **kwargs)
+            entry = store.get(namespace, key)
+
+            if entry is not None:
+                value, fetched, _ = entry
+                age = time.monotonic() - fetched
+                if age < ttl:
+                    return value
+                if age < ttl + max_stale:
+                    with lock:
+                        if key not in refreshing:
+                            refreshing.add(key)
+                            _refresh_executor.submit(refresh, key, args, kwargs)
+                    return value
+
+            value = fetch(args, kwargs)
+            save(key, value)
+
+            return value
+
+        def fetched_at(*args, **kwargs) -> Optional[datetime]:
+            entry = store.peek(namespace, hashkey(*args, **kwargs))
+
+            return entry[2] if entry is not None else None
+
+        def cache_set(value, *args, **kwargs):
+            save(hashkey(*args, **kwargs), value)
+
+        def cache_clear():
+            store.clear(namespace)
+
+        wrapper.fetched_at = fetched_at
+        wrapper.single_flight = flight
+        wrapper.cache_set = cache_set
+        wrapper.cache_clear = cache_clear
+
+        return wrapper
+
+    return decorator
+
+
+def cache_stats() -> dict:
+    return cache_store.stats()
@@ -0,0 +1,88 @@
+"""Chart layer for the resumo page.
+
+Charts are drawn through ``st.cache_data`` functions keyed by a hash of the
+plotted data, so an unchanged chart replays the element Streamlit already
+serialized instead of rebuilding and re-serializing the figure or the
+Vega-Lite spec. The charts are drawn with the module level ``st`` calls so
+the replay lands in whichever ``with`` block is active at the call site.
+"""
+
+import hashlib
+from typing import Callable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+from plotly.graph_objects import Figure
+
+OTHERS_LABEL = "outros"
+MAX_CHARTS = 256
+
+
+def data_version(data: Union[pd.Series, pd.DataFrame]) -> str:
+    digest = hashlib.sha1(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+    names = data.columns if isinstance(data, pd.DataFrame) else [data.name]
+    digest.update(repr(list(names)).encode())
+
+    return digest.hexdigest()
+
+
+def collapse_tail(series: pd.Series, max_items: int) -> pd.Series:
+    if len(series) <= max_items:
+        return series
+
+    top = series.nlargest(max_items - 1)
+    others = series.drop(top.index).sum()
+
+    return pd.concat([top, pd.Series({OTHERS_LABEL: others}, name=series.name)])
+
+
+@st.cache_data(max_entries=MAX_CHARTS, show_spinner=False)
+def _plotly_chart(version: tuple, _build: Callable[[], Figure]):
+    st.plotly_chart(_build(), use_container_width=True)
+
+
+@st.cache_data(max_entries=MAX_CHARTS, show_spinner=False)
+def _native_chart(kind: str, version: str, y: Optional[str], _frame: pd.DataFrame):
+    getattr(st, kind)(_frame, y=y, use_container_width=True)
+
+
+def pie_chart(
+    frame: pd.DataFrame,
+    values: str,
+    title: str,
+    names: Optional[List[str]] = None,
+    max_items: int = 6,
+):
+    series = frame[values].copy()
+    if names is not None:
+        series.index = names
+    series = collapse_tail(series, max_items)
+
+    _plotly_chart(
+        ("pie", title, data_version(series)),
+        lambda: px.pie(names=series.index, values=series.values, title=title),
+    )
+
+
+def heatmap_chart(matrix: np.ndarray, x: List[str], y: List[str], title: str):
+    _plotly_chart(
+        ("heatmap", title, hashlib.sha1(matrix.tobytes()).hexdigest(), *x, *y),
+        lambda: px.imshow(
+            matrix,
+            x=x,
+            y=y,
+            title=title,
+            aspect="auto",
+            color_continuous_scale="Blues",
+        ),
+    )
+
+
+def area_chart(frame: pd.DataFrame, y: Optional[str] = None):
+    _native_chart("area_chart", data_version(frame), y, frame)
+
+
+def bar_chart(frame: pd.DataFrame, y: Optional[str] = None):
+    _native_chart("bar_chart", data_version(frame), y, frame)
@@ -0,0 +1,286 @@
+import decimal
+import functools
+from datetime import date, datetime
+from typing import Callable, Dict, Hashable, List, Optional
+
+from helpers.api import (
+    get_bills_by_ids,
+    get_payments,
+    get_sales,
+    get_stock_outs_by_month,
+)
+from helpers.bucketing import (
+    Period,
+    period_totals,
+    sale_moments,
+    weekday_hour_histogram,
+)
+from helpers.cache import approximate_size, cache_store
+from helpers.ingest import live_month
+from helpers.stock_moves import StockMovesTable
+from models.bills import Bills
+from models.enums import PaymentsMethods, ReferenceTable
+from models.payments import Payment
+from models.sales import Sale
+
+days = [
+    "1 - Segunda",
+    "2 - Terça",
+    "3 - Quarta",
+    "4 - Quinta",
+    "5 - Sexta",
+    "6 - Sábado",
+    "7 - Domingo",
+]
+
+periods = {
+    "manha": ((6, 0), (11, 59)),
+    "tarde": ((12, 0), (17, 59)),
+    "noite": ((18, 0), (23, 59)),
+    "madrugada": ((0, 0), (5, 59)),
+}
+
+
+def _expenses(payments: List[Payment], bills_to_pay: Dict[int, Bills]) -> float:
+    expenses: decimal = 0
+    for payment in payments:
+        if payment.reference_table is ReferenceTable.BILLS_TO_PAY:
+            bill = bills_to_pay.get(payment.reference_id)
+            if bill and bill.reference_table is not ReferenceTable.STOCK_ENTRIES:
+                expenses += payment.value
+
+    return expenses
+
+
+def _faturamento_report(totals: dict, expenses: float, cogs: float) -> dict:
+    daily = {
+        day: float(total)
+        for day, total in zip(days, totals["by_weekday_hour"].sum(axis=1))
+    }
+
+    return {
+        **{day: daily.get(day, 0) for day in [*days[1:], days[0]]},
+        "by_payment_methods": totals["by_payment_methods"],
+        "by_periods": totals["by_periods"],
+        "by_weekday_hour": totals["by_weekday_hour"],
+        "receitas": totals["receitas"],
+        "despesas": expenses,
+        "descontos": totals["descontos"],
+        "cmv": cogs,
+        "vendas": totals["vendas"],
+    }
+
+
+def get_faturamento_data(
+    payments: List[Payment],
+    sales: List[Sale],
+    stock_outs: StockMovesTable,
+    bills_to_pay: Dict[int, Bills],
+    periods: Dict[str, Period] = periods,
+):
+    revenues: decimal = 0
+    discounts: decimal = 0
+    by_payment_methods = {payment: 0 for payment in PaymentsMethods.__members__}
+
+    moments, values = sale_moments(sales)
+
+    sales_by_id = {sale.id: sale for sale in sales}
+    for payment in payments:
+        if payment.reference_table is ReferenceTable.SALES:
+            revenues += payment.value
+            try:
+                sale = sales_by_id[payment.reference_id]
+            except KeyError:
+                continue
+            revenues += sale.discount
+            discounts += sale.discount
+            by_payment_methods[payment.payment_method.name] += payment.value
+
+    totals = {
+        "by_payment_methods": by_payment_methods,
+        "by_periods": period_totals(moments, values, periods),
+        "by_weekday_hour": weekday_hour_histogram(moments, values),
+        "receitas": revenues,
+        "descontos": discounts,
+        "vendas": len(sales),
+    }
+
+    return _faturamento_report(
+        totals, _expenses(payments, bills_to_pay), float(stock_outs.value.sum())
+    )
+
+
+def _month_bills(payments: List[Payment], month: date, headers: tuple):
+    return get_bills_by_ids(
+        [
+            payment.reference_id
+            for payment in payments
+            if payment.reference_table is ReferenceTable.BILLS_TO_PAY
+        ],
+        headers,
+        month=month,
+    )
+
+
+def _read(fetcher, month: date, headers: tuple, cached: bool = True):
+    # uncached reads still use what the cache already holds, but do not add
+    # months that only an export asked for
+    if cached or fetcher.fetched_at(month, headers) is not None:
+        return fetcher(month, headers)
+
+    return fetcher.__wrapped__(month, headers)
+
+
+def get_month_faturamento(
+    month: date,
+    headers: tuple,
+    periods: Dict[str, Period] = periods,
+    cached: bool = True,
+) -> dict:
+    stock_outs = _read(get_stock_outs_by_month, month, headers, cached)
+
+    ingestor = live_month(month, headers)
+    if ingestor is not None:
+        totals, bill_payments = ingestor.faturamento(periods)
+        return _faturamento_report(
+            totals,
+            _expenses(bill_payments, _month_bills(bill_payments, month, headers)),
+            float(stock_outs.value.sum()),
+        )
+
+    payments = _read(get_payments, month, headers, cached)
+    sales = _read(get_sales, month, headers, cached)
+    bills_to_pay = _month_bills(payments, month, headers)
+
+    return get_faturamento_data(payments, sales, stock_outs, bills_to_pay, periods)
+
+
+def get_month_sales(month: date, headers: tuple, cached: bool = True) -> List[Sale]:
+    ingestor = live_month(month, headers)
+    if ingestor is not None:
+        return ingestor.sales()
+
+    return _read(get_sales, month, headers, cached)
+
+
+def get_month_payments(
+    month: date, headers: tuple, cached: bool = True
+) -> List[Payment]:
+    ingestor = live_month(month, headers)
+    if ingestor is not None:
+        return ingestor.payments()
+
+    return _read(get_payments, month, headers, cached)
+
+
+def get_month_fetched_at(month: date, headers: tuple) -> Optional[datetime]:
+    ingestor = live_month(month, headers)
+    if ingestor is not None:
+        return ingestor.updated_at
+
+    moments = [
+        get_sales.fetched_at(month, headers),
+        get_payments.fetched_at(month, headers),
+    ]
+
+    return min((moment for moment in moments if moment), default=None)
+
+
+def get_sales_version(month: date, headers: tuple) -> Optional[Hashable]:
+    ingestor = live_month(month, headers)
+    if ingestor is not None:
+        return ("live", ingestor.cursor)
+
+    return get_sales.fetched_at(month, headers)
+
+
+def get_stock_outs_version(month: date, headers: tuple) -> Optional[Hashable]:
+    return get_stock_outs_by_month.fetched_at(month, headers)
+
+
+def versioned_partials(version: Callable[[date, tuple], Optional[Hashable]]):
+    """Caches a month's partial totals by company and data version.
+
+    Sessions of a company that see the same fetch share one copy, and a month
+    is only walked again once ``version`` reports new data for it. With
+    ``cached=False`` months the cache does not hold yet are computed without
+    being stored.
+    """
+
+    def decorator(func):
+        namespace = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(month: date, headers: tuple, cached: bool = True):
+            company = dict(headers)["company"]
+            current = version(month, headers)
+            if current is not None:
+                partials = cache_store.get(namespace, (company, month, current))
+                if partials is not None:
+                    return partials
+            elif not cached:
+                return func(month, headers, cached=False)
+
+            partials = func(month, headers)
+            current = version(month, headers)
+            if current is not None:
+                cache_store.set(
+                    namespace,
+                    (company, month, current),
+                    partials,
+                    approximate_size(partials),
+                )
+
+            return partials
+
+        wrapper.version = version
+
+        return wrapper
+
+    return decorator
+
+
+@versioned_partials(get_stock_outs_version)
+def get_month_products(
+    month: date, headers: tuple, cached: bool = True
+) -> Dict[str, float]:
+    return _read(get_stock_outs_by_month, month, headers, cached).amount_by_product()
+
+
+@versioned_partials(get_sales_version)
+def get_month_services(
+    month: date, headers: tuple, cached: bool = True
+) -> Dict[str, float]:
+    ingestor = live_month(month, headers)
+    if ingestor is not None:
+        return ingestor.services()
+
+    resumo = {}
+
+    for sale in _read(get_sales, month, headers, cached):
+        for service in sale.services.items():
+            try:
+                resumo[service[0]] += float(service[1])
+            except KeyError:
+                resumo[service[0]] = float(service[1])
+
+    return resumo
+
+
+@versioned_partials(get_sales_version)
+def get_month_customers(
+    month: date, headers: tuple, cached: bool = True
+) -> Dict[int, float]:
+    ingestor = live_month(month, headers)
+    if ingestor is not None:
+        return ingestor.customers()
+
+    resumo = {}
+
+    for sale in _read(get_sales, month, headers, cached):
+        try:
+            resumo[sale.customer] += sale.value
+        except KeyError:
+            resumo[sale.customer] = sale.value
+
+    return resumo
@@ -0,0 +1,304 @@
+"""Streams dashboard tables and raw ledgers to CSV, Parquet or XLSX.
+
+Every table is produced one month at a time straight from the fetch layer
+and appended to the output, so only a single month is held in memory.
+Months the dashboard has not cached are fetched without caching them.
+
+Usage: python -m helpers.export COMPANY USERNAME --months 2024-01 2024-02
+    --table dre --format csv --output dre.csv
+"""
+
+import argparse
+import csv
+import getpass
+import json
+from datetime import date
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+import pandas as pd
+
+from helpers.api import (
+    get_customer_data,
+    get_headers,
+    get_service_data,
+)
+from helpers.auth import sessions
+from helpers.dre import (
+    get_month_customers,
+    get_month_faturamento,
+    get_month_payments,
+    get_month_products,
+    get_month_sales,
+    get_month_services,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+DRE_COLUMNS = [
+    "receitas",
+    "descontos",
+    "receita_liquida",
+    "cmv",
+    "lucro_bruto",
+    "despesas",
+    "lucro_liquido",
+    "vendas",
+]
+FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _month_label(month: date) -> str:
+    return month.strftime("%m/%y")
+
+
+def _dre_row(label: str, faturamento: dict) -> dict:
+    receita_liquida = float(faturamento["receitas"]) - float(faturamento["descontos"])
+    lucro_bruto = receita_liquida - float(faturamento["cmv"])
+
+    return {
+        "mes": label,
+        "receitas": float(faturamento["receitas"]),
+        "descontos": float(faturamento["descontos"]),
+        "receita_liquida": receita_liquida,
+        "cmv": float(faturamento["cmv"]),
+        "lucro_bruto": lucro_bruto,
+        "despesas": float(faturamento["despesas"]),
+        "lucro_liquido": lucro_bruto - float(faturamento["despesas"]),
+        "vendas": int(faturamento["vendas"]),
+    }
+
+
+def iter_dre(months: Iterable[date], headers: tuple) -> Iterator[pd.DataFrame]:
+    acumulado = dict.fromkeys(DRE_COLUMNS, 0)
+    for month in months:
+        row = _dre_row(
+            _month_label(month), get_month_faturamento(month, headers, cached=False)
+        )
+        for column in DRE_COLUMNS:
+            acumulado[column] += row[column]
+        yield pd.DataFrame([row])
+
+    yield pd.DataFrame([{"mes": "acumulado", **acumulado}])
+
+
+def _iter_ranking(
+    partials: Callable[[date, tuple], Dict],
+    label: Optional[Callable[[int, tuple], object]],
+):
+    def iter_ranking(
+        months: Iterable[date], headers: tuple, names: bool = True
+    ) -> Iterator[pd.DataFrame]:
+        for month in months:
+            totals = sorted(
+                partials(month, headers, cached=False).items(),
+                key=lambda item: item[1],
+                reverse=True,
+            )
+            chunk = pd.DataFrame(
+                {
+                    "mes": _month_label(month),
+                    "id": [key for key, _ in totals],
+                    "valor": [float(value) for _, value in totals],
+                }
+            )
+            if names and label:
+                chunk.insert(2, "nome", [label(key, headers) for key in chunk["id"]])
+            yield chunk
+
+    return iter_ranking
+
+
+def _customer_name(customer_id: int, headers: tuple) -> str:
+    return get_customer_data(customer_id, headers).get_full_name()
+
+
+def _service_name(service_id: int, headers: tuple) -> str:
+    return get_service_data(service_id, headers).name
+
+
+def iter_sales(months: Iterable[date], headers: tuple) -> Iterator[pd.DataFrame]:
+    for month in months:
+        yield pd.DataFrame(
+            [
+                {
+                    "id": sale.id,
+                    "moment": sale.moment,
+                    "customer": sale.customer,
+                    "value": sale.value,
+                    "amount_paid": sale.amount_paid,
+                    "discount": sale.discount,
+                    "increase": sale.increase,
+                    "closed": sale.isClosed,
+                    "promotion": sale.promotion,
+                    "products": json.dumps(sale.products),
+                    "services": json.dumps(sale.services),
+                    "user_id": sale.user_id,
+                    "observation": sale.observation,
+                }
+                for sale in get_month_sales(month, headers, cached=False)
+            ]
+        )
+
+
+def iter_payments(months: Iterable[date], headers: tuple) -> Iterator[pd.DataFrame]:
+    for month in months:
+        yield pd.DataFrame(
+            [
+                {
+                    "id": payment.id,
+                    "done": payment.done,
+                    "reference_table": payment.reference_table.name,
+                    "reference_id": payment.reference_id,
+                    "value": payment.value,
+                    "payment_method": payment.payment_method.name,
+                    "cash_register": payment.cash_register,
+                    "user_id": payment.user_id,
+                }
+                for payment in get_month_payments(month, headers, cached=False)
+            ]
+        )
+
+
+TABLES = {
+    "dre": iter_dre,
+    "clientes": _iter_ranking(get_month_customers, _customer_name),
+    "produtos": _iter_ranking(get_month_products, None),
+    "servicos": _iter_ranking(get_month_services, _service_name),
+    "vendas": iter_sales,
+    "pagamentos": iter_payments,
+}
+
+
+def iter_table(
+    table: str, months: Iterable[date], headers: tuple, names: bool = True
+) -> Iterator[pd.DataFrame]:
+    months = sorted(months)
+    if table in ("clientes", "produtos", "servicos"):
+        return TABLES[table](months, headers, names=names)
+
+    return TABLES[table](months, headers)
+
+
+def write_csv(chunks: Iterator[pd.DataFrame], output) -> int:
+    rows = 0
+    with open(output, "w", newline="", encoding="utf-8") as file:
+        writer = None
+        for chunk in chunks:
+            if writer is None:
+                writer = csv.writer(file)
+                writer.writerow(chunk.columns)
+            writer.writerows(chunk.itertuples(index=False, name=None))
+            rows += len(chunk)
+
+    return rows
+
+
+def write_parquet(chunks: Iterator[pd.DataFrame], output) -> int:
+    if pq is None:
+        raise RuntimeError("Exporting to Parquet requires pyarrow")
+
+    rows = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            if writer is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                writer = pq.ParquetWriter(output, schema)
+            writer.write_table(
+                pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            )
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        pq.write_table(pa.table({}), output)
+
+    return rows
+
+
+def write_xlsx(chunks: Iterator[pd.DataFrame], output) -> int:
+    if openpyxl is None:
+        raise RuntimeError("Exporting to XLSX requires openpyxl")
+
+    rows = 0
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    header = False
+    for chunk in chunks:
+        if not header:
+            sheet.append(list(chunk.columns))
+            header = True
+        for row in chunk.itertuples(index=False, name=None):
+            sheet.append(list(row))
+        rows += len(chunk)
+    workbook.save(output)
+
+    return rows
+
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet, "xlsx": write_xlsx}
+
+
+def export_table(
+    table: str,
+    months: Iterable[date],
+    headers: tuple,
+    fmt: str,
+    output,
+    names: bool = True,
+) -> int:
+    return WRITERS[fmt](iter_table(table, months, headers, names=names), output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("company")
+    parser.add_argument("username")
+    parser.add_argument(
+        "--months",
+        nargs="+",
+        required=True,
+        type=lambda value: date.fromisoformat(f"{value}-01"),
+        help="months as YYYY-MM",
+    )
+    parser.add_argument("--table", choices=TABLES, default="dre")
+    parser.add_argument("--format", choices=WRITERS, default="csv")
+    parser.add_argument("--output")
+    parser.add_argument(
+        "--no-names",
+        action="store_true",
+        help="skip the customer and service name lookups",
+    )
+    args = parser.parse_args(argv)
+
+    session = sessions.login(args.username, getpass.getpass("Senha: "), args.company)
+    output = args.output or f"{args.table}.{args.format}"
+    rows = export_table(
+        args.table,
+        args.months,
+        get_headers(session.company, session.token),
+        args.format,
+        output,
+        names=not args.no_names,
+    )
+    print(f"{rows} linhas exportadas para {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""Keeps the current month live by applying sale and payment events.
+
+An ``Ingestor`` seeds a ``LiveMonth`` from ``/sales`` and ``/payments`` and
+then polls ``/events`` from a cursor, applying each event in place. There is
+one ingestor per company and every session of that company reads the live
+month from it through ``live_month``, so the dashboard sees new sales within
+``POLL_INTERVAL`` without refetching the whole month. Companies whose API
+has no events feed fall back to the regular TTL refresh.
+"""
+
+import logging
+import threading
+import time
+from datetime import date, datetime
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from requests import HTTPError
+
+from helpers.api import (
+    get_events,
+    get_payments,
+    get_sales,
+    parse_payment,
+    parse_sale,
+)
+from helpers.bucketing import (
+    MINUTES_PER_DAY,
+    Period,
+    minute_period_totals,
+    moment_bin,
+)
+from models.enums import PaymentsMethods, ReferenceTable
+from models.payments import Payment
+from models.sales import Sale
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 5
+IDLE_TIMEOUT = 10 * 60
+UNSUPPORTED_RETRY = 60 * 60
+
+
+class RunningTotals:
+    def __init__(self):
+        self._totals: Dict[Hashable, float] = {}
+        self._counts: Dict[Hashable, int] = {}
+
+    def add(self, key: Hashable, value: float, sign: int = 1):
+        count = self._counts.get(key, 0) + sign
+        if count:
+            self._counts[key] = count
+            self._totals[key] = self._totals.get(key, 0) + sign * value
+        else:
+            self._counts.pop(key, None)
+            self._totals.pop(key, None)
+
+    def as_dict(self) -> Dict[Hashable, float]:
+        return dict(self._totals)
+
+
+class LiveMonth:
+    """Sales and payments of one month, updated one event at a time.
+
+    Every per-month aggregate the dashboard shows is kept alongside and
+    adjusted by each event instead of being recomputed from every sale of
+    the month. Sale values are binned by weekday and minute of the day, so
+    both the hourly heatmap and any set of day periods can be read from it.
+    """
+
+    def __init__(self, month: date, sales: Iterable[Sale], payments: Iterable[Payment]):
+        self.month = month
+        self.sales: Dict[int, Sale] = {}
+        self.payments: Dict[int, Payment] = {}
+        self.bill_payments: Dict[int, Payment] = {}
+        self.customers = RunningTotals()
+        self.services = RunningTotals()
+        self.revenues = 0.0
+        self.discounts = 0.0
+        self.by_payment_methods = {
+            payment: 0.0 for payment in PaymentsMethods.__members__
+        }
+        self.by_weekday_minute = np.zeros((7, MINUTES_PER_DAY))
+        self._sale_payments: Dict[int, Set[int]] = {}
+        for sale in sales:
+            self._set_sale(sale.id, sale)
+        for payment in payments:
+            self._set_payment(payment.id, payment)
+
+    def _in_month(self, moment: datetime) -> bool:
+        return (moment.year, moment.month) == (self.month.year, self.month.month)
+
+    def _count_sale(self, sale: Sale, sign: int):
+        self.customers.add(sale.customer, sale.value, sign)
+        for service, amount in sale.services.items():
+            self.services.add(service, float(amount), sign)
+        weekday, minute = moment_bin(sale.moment)
+        self.by_weekday_minute[weekday, minute] += sign * (sale.value + sale.discount)
+
+    def _count_payment(self, payment: Payment, sign: int):
+        if payment.reference_table is not ReferenceTable.SALES:
+            return
+
+        self.revenues += sign * payment.value
+        sale = self.sales.get(payment.reference_id)
+        if sale is not None:
+            self.revenues += sign * sale.discount
+            self.discounts += sign * sale.discount
+            self.by_payment_methods[payment.payment_method.name] += sign * payment.value
+
+    def _link(self, payment: Payment):
+        if payment.reference_table is ReferenceTable.SALES:
+            self._sale_payments.setdefault(payment.reference_id, set()).add(payment.id)
+        elif payment.reference_table is ReferenceTable.BILLS_TO_PAY:
+            self.bill_payments[payment.id] = payment
+
+    def _unlink(self, payment: Payment):
+        if payment.reference_table is ReferenceTable.SALES:
+            linked = self._sale_payments[payment.reference_id]
+            linked.discard(payment.id)
+            if not linked:
+                del self._sale_payments[payment.reference_id]
+        elif payment.reference_table is ReferenceTable.BILLS_TO_PAY:
+            self.bill_payments.pop(payment.id, None)
+
+    def _set_sale(self, sale_id: int, sale: Optional[Sale]):
+        # payments add the discount of their sale, so they are recounted
+        # around any change to it
+        linked = [
+            self.payments[payment_id]
+            for payment_id in self._sale_payments.get(sale_id, ())
+        ]
+        for payment in linked:
+            self._count_payment(payment, -1)
+
+        previous = self.sales.get(sale_id)
+        if previous is not None:
+            self._count_sale(previous, -1)
+        if sale is None:
+            self.sales.pop(sale_id, None)
+        else:
+            self.sales[sale_id] = sale
+            self._count_sale(sale, 1)
+
+        for payment in linked:
+            self._count_payment(payment, 1)
+
+    def _set_payment(self, payment_id: int, payment: Optional[Payment]):
+        previous = self.payments.get(payment_id)
+        if previous is not None:
+            self._count_payment(previous, -1)
+            self._unlink(previous)
+        if payment is None:
+            self.payments.pop(payment_id, None)
+        else:
+            self.payments[payment_id] = payment
+            self._link(payment)
+            self._count_payment(payment, 1)
+
+    def apply(self, event: dict) -> bool:
+        data = event["data"]
+        delete = event.get("action") == "delete"
+
+        if event["type"] == "sale":
+            sale = None if delete else parse_sale(data)
+            if sale is not None and not self._in_month(sale.moment):
+                sale = None
+            self._set_sale(data["id"], sale)
+            return True
+
+        if event["type"] == "payment":
+            payment = None if delete else parse_payment(data)
+            if payment is not None and not self._in_month(payment.done):
+                payment = None
+            self._set_payment(data["id"], payment)
+            return True
+
+        return False
+
+    def faturamento(self, periods: Dict[str, Period]) -> dict:
+        return {
+            "by_payment_methods": dict(self.by_payment_methods),
+            "by_periods": minute_period_totals(
+                self.by_weekday_minute.sum(axis=0), periods
+            ),
+            "by_weekday_hour": self.by_weekday_minute.reshape(7, 24, 60).sum(axis=2),
+            "receitas": self.revenues,
+            "descontos": self.discounts,
+            "vendas": len(self.sales),
+        }
+
+
+class EventsUnsupported(Exception):
+    pass
+
+
+class Ingestor:
+    def __init__(self, month: date, headers: tuple, interval: float = POLL_INTERVAL):
+        self.month = month
+        self.headers = headers
+        self.interval = interval
+        self.cursor: Optional[int] = None
+        self.live: Optional[LiveMonth] = None
+        self.applied = 0
+        self.updated_at: Optional[datetime] = None
+        self.last_seen = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return not self._stop.is_set()
+
+    def _events(self) -> dict:
+        response = get_events(self.cursor, self.headers)
+        if response.status_code == 404:
+            raise EventsUnsupported(dict(self.headers)["company"])
+        response.raise_for_status()
+
+        return response.json()
+
+    def seed(self):
+        # read the cursor before the snapshot: events replayed on top of it
+        # are idempotent upserts, while events before it would be lost
+        cursor = self._events()["cursor"]
+        live = LiveMonth(
+            self.month,
+            get_sales.__wrapped__(self.month, self.headers),
+            get_payments.__wrapped__(self.month, self.headers),
+        )
+        with self._lock:
+            self.live = live
+            self.cursor = cursor
+            self.updated_at = datetime.now()
+
+    def poll(self) -> int:
+        page = self._events()
+        with self._lock:
+            applied = sum(self.live.apply(event) for event in page["events"])
+            self.cursor = page["cursor"]
+            self.applied += applied
+            self.updated_at = datetime.now()
+
+        return applied
+
+    def sales(self) -> List[Sale]:
+        with self._lock:
+            return list(self.live.sales.values())
+
+    def payments(self) -> List[Payment]:
+        with self._lock:
+            return list(self.live.payments.values())
+
+    def faturamento(self, periods: Dict[str, Period]) -> Tuple[dict, List[Payment]]:
+        with self._lock:
+            return (
+                self.live.faturamento(periods),
+                list(self.live.bill_payments.values()),
+            )
+
+    def customers(self) -> Dict[int, float]:
+        with self._lock:
+            return self.live.customers.as_dict()
+
+    def services(self) -> Dict[str, float]:
+        with self._lock:
+            return self.live.services.as_dict()
+
+    def touch(self, headers: tuple):
+        self.headers = headers
+        self.last_seen = time.monotonic()
+
+    def _run(self):
+        try:
+            self.seed()
+            while not self._stop.wait(self.interval):
+                if time.monotonic() - self.last_seen > IDLE_TIMEOUT:
+                    break
+                self.poll()
+        except EventsUnsupported as e:
+            with _registry_lock:
+                _unsupported[str(e)] = time.monotonic() + UNSUPPORTED_RETRY
+        except HTTPError:
+            logger.warning("Event ingestion for %s stopped", self.month, exc_info=True)
+        except Exception:
+            logger.exception("Event ingestion for %s failed", self.month)
+        finally:
+            self._stop.set()
+
+    def start(self) -> "Ingestor":
+        self._thread = threading.Thread(
+            target=self._run, daemon=True, name=f"ingest-{self.month}"
+        )
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+_ingestors: Dict[str, Ingestor] = {}
+_unsupported: Dict[str, float] = {}
+_registry_lock = threading.Lock()
+
+
+def register(ingestor: Ingestor) -> Ingestor:
+    company = dict(ingestor.headers)["company"]
+    with _registry_lock:
+        previous = _ingestors.get(company)
+        if previous is not None and previous is not ingestor:
+            previous.stop()
+        _ingestors[company] = ingestor
+
+    return ingestor
+
+
+def follow(month: date, headers: tuple) -> Optional[Ingestor]:
+    company = dict(headers)["company"]
+    with _registry_lock:
+        if time.monotonic() < _unsupported.get(company, 0):
+            return None
+        ingestor = _ingestors.get(company)
+    if ingestor is None or ingestor.month != month or not ingestor.running:
+        ingestor = register(Ingestor(month, headers)).start()
+    ingestor.touch(headers)
+
+    return ingestor
+
+
+def live_month(month: date, headers: tuple) -> Optional[Ingestor]:
+    ingestor = _ingestors.get(dict(headers)["company"])
+    if ingestor is None or ingestor.month != month or not ingestor.running:
+        return None
+    if ingestor.live is None:
+        return None
+
+    return ingestor
+
+
+def ingest_stats() -> List[dict]:
+    return [
+        {
+            "company": company,
+            "month": ingestor.month,
+            "running": ingestor.running,
+            "cursor": ingestor.cursor,
+            "applied": ingestor.applied,
+        }
+        for company, ingestor in list(_ingestors.items())
+    ]
@@ -0,0 +1,130 @@
+import heapq
+import threading
+from operator import itemgetter
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import cachetools
+import pandas as pd
+
+MAX_SHARED_RANKINGS = 64
+
+
+class TopKRanking:
+    """Keeps per-month partial totals and the accumulated top-K across them.
+
+    Months are merged into (or removed from) the accumulated totals
+    incrementally, and the top ``max_k`` entries are selected with a heap,
+    so changing the requested ``k`` never sorts the whole population.
+    Months refreshed with an unchanged data version are skipped without
+    looking at their partials.
+    """
+
+    def __init__(self, max_k: int = 100):
+        self.max_k = max_k
+        self._lock = threading.RLock()
+        self._months: Dict[str, Dict[Hashable, float]] = {}
+        self._versions: Dict[str, Hashable] = {}
+        self._totals: Dict[Hashable, float] = {}
+        self._counts: Dict[Hashable, int] = {}
+        self._top: Optional[List[Tuple[Hashable, float]]] = None
+
+    @property
+    def months(self) -> List[str]:
+        return list(self._months)
+
+    def __len__(self) -> int:
+        return len(self._totals)
+
+    def update_month(self, month: str, partials: Dict[Hashable, float]):
+        with self._lock:
+            if self._months.get(month) == partials:
+                return
+
+            self.remove_month(month)
+            # partials are shared with the month cache and never mutated
+            self._months[month] = partials
+            for key, value in partials.items():
+                self._totals[key] = self._totals.get(key, 0) + value
+                self._counts[key] = self._counts.get(key, 0) + 1
+            self._top = None
+
+    def refresh_month(
+        self,
+        month: str,
+        version: Optional[Hashable],
+        partials: Callable[[], Dict[Hashable, float]],
+    ):
+        with self._lock:
+            if version is not None and self._versions.get(month) == version:
+                return
+
+            self.update_month(month, partials())
+            self._versions[month] = version
+
+    def remove_month(self, month: str):
+        with self._lock:
+            self._versions.pop(month, None)
+            partials = self._months.pop(month, None)
+            if partials is None:
+                return
+
+            for key, value in partials.items():
+                self._counts[key] -= 1
+                if self._counts[key]:
+                    self._totals[key] -= value
+                else:
+                    del self._counts[key]
+                    del self._totals[key]
+            self._top = None
+
+    def retain_months(self, months: Iterable[str]):
+        months = set(months)
+        with self._lock:
+            for month in [month for month in self._months if month not in months]:
+                self.remove_month(month)
+
+    def top(self, k: int) -> List[Tuple[Hashable, float]]:
+        with self._lock:
+            if k > self.max_k:
+                self.max_k = k
+                self._top = None
+            if self._top is None:
+                self._top = heapq.nlargest(
+                    self.max_k, self._totals.items(), key=itemgetter(1)
+                )
+
+            return self._top[:k]
+
+    def frame(
+        self,
+        k: int,
+        months: Optional[List[str]] = None,
+        label: Optional[Callable[[Hashable], str]] = None,
+    ) -> pd.DataFrame:
+        with self._lock:
+            months = self.months if months is None else months
+            top = self.top(k)
+            rows = [
+                [self._months[month].get(key, 0) for month in months] + [total]
+                for key, total in top
+            ]
+
+        return pd.DataFrame(
+            rows,
+            index=[label(key) if label else key for key, _ in top],
+            columns=[*months, "acumulado"],
+        )
+
+
+_shared = cachetools.LRUCache(maxsize=MAX_SHARED_RANKINGS)
+_shared_lock = threading.Lock()
+
+
+def shared_ranking(*key: Hashable) -> TopKRanking:
+    """Returns the ranking every session asking for ``key`` shares."""
+    with _shared_lock:
+        ranking = _shared.get(key)
+        if ranking is None:
+            ranking = _shared[key] = TopKRanking()
+
+    return ranking
@@ -0,0 +1,81 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+AUTH_STATUSES = {401, 403}
+
+
+def is_auth_error(error: BaseException) -> bool:
+    response = getattr(error, "response", None)
+
+    return getattr(response, "status_code", None) in AUTH_STATUSES
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls sharing a key into one execution.
+
+    The first caller for a key runs ``fn``; callers arriving while it is in
+    flight wait for it and receive the same result (or exception). Errors
+    for which ``private_error`` is true, such as the leader's expired
+    session token, are not shared: each waiter runs ``fn`` with its own
+    arguments instead.
+    """
+
+    def __init__(
+        self, private_error: Optional[Callable[[BaseException], bool]] = is_auth_error
+    ):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.private_error = private_error
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+        self.private_retries = 0
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.upstream_calls += 1
+            else:
+                self.coalesced_calls += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is None:
+                return call.result
+            if not (self.private_error and self.private_error(call.error)):
+                raise call.error
+            with self._lock:
+                self.coalesced_calls -= 1
+                self.upstream_calls += 1
+                self.private_retries += 1
+            return fn(*args, **kwargs)
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "upstream_calls": self.upstream_calls,
+                "coalesced_calls": self.coalesced_calls,
+                "private_retries": self.private_retries,
+                "in_flight": len(self._calls),
+            }
@@ -0,0 +1,209 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from pydantic import TypeAdapter
+
+from models.stocks import Stock, StockMoves
+
+ENTRY = 1
+OUT = -1
+
+_datetime = TypeAdapter(datetime)
+
+
+def _local_moment(value) -> datetime:
+    # parsed like the StockMoves model did, keeping the wall-clock time of
+    # offset-aware moments so they stay on the day the API reported
+    return _datetime.validate_python(value).replace(tzinfo=None)
+
+
+def _to_moment(value: date) -> int:
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+
+    return int(np.datetime64(value, "us").astype(np.int64))
+
+
+class StockMovesTable:
+    """Columnar store of every stock move of a company.
+
+    Each field lives in its own NumPy array; ``product_id`` and ``user_id``
+    are stored as codes into the ``product_ids``/``user_ids`` lookups and
+    ``moment`` as int64 microseconds. ``StockMoves`` objects are only built
+    on demand through ``move``/``moves``.
+    """
+
+    columns = (
+        "id",
+        "product_id",
+        "stock_id",
+        "moment",
+        "amount",
+        "value",
+        "direction",
+        "user_id",
+    )
+
+    def __init__(
+        self,
+        id: np.ndarray,
+        product_id: np.ndarray,
+        stock_id: np.ndarray,
+        moment: np.ndarray,
+        amount: np.ndarray,
+        value: np.ndarray,
+        direction: np.ndarray,
+        user_id: np.ndarray,
+        product_ids: List[str],
+        user_ids: List[str],
+    ):
+        self.id = id
+        self.product_id = product_id
+        self.stock_id = stock_id
+        self.moment = moment
+        self.amount = amount
+        self.value = value
+        self.direction = direction
+        self.user_id = user_id
+        self.product_ids = product_ids
+        self.user_ids = user_ids
+
+    @classmethod
+    def _from_rows(
+        cls, rows: Dict[str, list], product_codes: dict, user_codes: dict
+    ) -> "StockMovesTable":
+        return cls(
+            id=np.array(rows["id"], dtype=np.int64),
+            product_id=np.array(rows["product_id"], dtype=np.int32),
+            stock_id=np.array(rows["stock_id"], dtype=np.int64),
+            moment=np.array(rows["moment"], dtype="datetime64[us]").astype(np.int64),
+            amount=np.array(rows["amount"], dtype=np.float64),
+            value=np.array(rows["value"], dtype=np.float64),
+            direction=np.array(rows["direction"], dtype=np.int8),
+            user_id=np.array(rows["user_id"], dtype=np.int32),
+            product_ids=list(product_codes),
+            user_ids=list(user_codes),
+        )
+
+    @classmethod
+    def from_stocks(cls, stocks: List[Stock]) -> "StockMovesTable":
+        product_codes: Dict[str, int] = {}
+        user_codes: Dict[str, int] = {}
+        rows = {column: [] for column in cls.columns}
+
+        for stock in stocks:
+            for direction, moves in (
+                (ENTRY, stock.entries.moves),
+                (OUT, stock.outs.moves),
+            ):
+                for move in moves:
+                    rows["id"].append(move.id)
+                    rows["product_id"].append(
+                        product_codes.setdefault(move.product_id, len(product_codes))
+                    )
+                    rows["stock_id"].append(move.stock_id)
+                    rows["moment"].append(_local_moment(move.moment))
+                    rows["amount"].append(move.amount)
+                    rows["value"].append(move.value)
+                    rows["direction"].append(direction)
+                    rows["user_id"].append(
+                        user_codes.setdefault(move.user_id, len(user_codes))
+                    )
+
+        return cls._from_rows(rows, product_codes, user_codes)
+
+    @classmethod
+    def from_payload(cls, stocks: List[dict]) -> "StockMovesTable":
+        """Builds the table straight from the ``/stock`` JSON, without
+        creating a ``StockMoves`` object per move."""
+        product_codes: Dict[str, int] = {}
+        user_codes: Dict[str, int] = {}
+        rows = {column: [] for column in cls.columns}
+
+        for stock in stocks:
+            for direction, key in ((ENTRY, "entries"), (OUT, "outs")):
+                for move in (stock.get(key) or {}).get("moves") or []:
+                    rows["id"].append(move["id"])
+                    rows["product_id"].append(
+                        product_codes.setdefault(
+                            str(move["productId"]), len(product_codes)
+                        )
+                    )
+                    rows["stock_id"].append(move["stockId"])
+                    rows["moment"].append(_local_moment(move["moment"]))
+                    rows["amount"].append(move["amount"])
+                    rows["value"].append(move["value"])
+                    rows["direction"].append(direction)
+                    rows["user_id"].append(
+                        user_codes.setdefault(str(move["userId"]), len(user_codes))
+                    )
+
+        return cls._from_rows(rows, product_codes, user_codes)
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, column).nbytes for column in self.columns)
+
+    def select(self, mask: np.ndarray) -> "StockMovesTable":
+        return StockMovesTable(
+            **{column: getattr(self, column)[mask] for column in self.columns},
+            product_ids=self.product_ids,
+            user_ids=self.user_ids,
+        )
+
+    def between(
+        self,
+        start: date,
+        end: date,
+        direction: Optional[int] = None,
+        stock_ids: Optional[List[int]] = None,
+    ) -> np.ndarray:
+        mask = (self.moment >= _to_moment(start)) & (
+            self.moment < _to_moment(end + timedelta(days=1))
+        )
+        if direction is not None:
+            mask &= self.direction == direction
+        if stock_ids is not None:
+            mask &= np.isin(self.stock_id, stock_ids)
+
+        return mask
+
+    def amount_by_product(self) -> Dict[str, float]:
+        totals = np.bincount(
+            self.product_id, weights=self.amount, minlength=len(self.product_ids)
+        )
+        present = np.bincount(self.product_id, minlength=len(self.product_ids))
+
+        return {
+            self.product_ids[code]: float(totals[code])
+            for code in np.flatnonzero(present)
+        }
+
+    def move(self, index: int) -> StockMoves:
+        return StockMoves(
+            id=int(self.id[index]),
+            product_id=self.product_ids[self.product_id[index]],
+            stock_id=int(self.stock_id[index]),
+            moment=self.moment[index].astype("datetime64[us]").item(),
+            amount=float(self.amount[index]),
+            value=float(self.value[index]),
+            user_id=self.user_ids[self.user_id[index]],
+        )
+
+    def moves(self) -> Iterator[StockMoves]:
+        for index in range(len(self)):
+            yield self.move(index)
+
+    def entries_of(self, stock_id: int) -> List[StockMoves]:
+        return list(
+            self.select((self.stock_id == stock_id) & (self.direction == ENTRY)).moves()
+        )
+
+    def outs_of(self, stock_id: int) -> List[StockMoves]:
+        return list(
+            self.select((self.stock_id == stock_id) & (self.direction == OUT)).moves()
+        )
@@ -0,0 +1,250 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests as rq
+
+from helpers.cache import approximate_size, cache_store
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+base_url = "https://api.duzzsystem.com.br"
+
+REQUEST_TIMEOUT = 60
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 10
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+COMPANY_RATE = 5
+COMPANY_BURST = 10
+
+ACCEPT_ENCODING = "br, gzip, deflate" if brotli else "gzip, deflate"
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for the upstream API.
+
+    The limit grows by ``1 / limit`` per healthy response and is multiplied
+    by ``decrease`` when a response fails with a retryable status, times
+    out, or when the endpoint's recent latency exceeds ``tolerance`` times
+    its long-term baseline.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 32,
+        decrease: float = 0.5,
+        tolerance: float = 2.0,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self._latency: Dict[str, float] = {}
+        self._baseline: Dict[str, float] = {}
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, endpoint: str, latency: float, failed: bool):
+        with self._condition:
+            self.in_flight -= 1
+            recent = self._latency.get(endpoint, latency) * 0.8 + latency * 0.2
+            baseline = self._baseline.get(endpoint, latency) * 0.98 + latency * 0.02
+            self._latency[endpoint] = recent
+            self._baseline[endpoint] = baseline
+
+            if failed or recent > baseline * self.tolerance:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "latency": dict(self._latency),
+            }
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
+        return wait
+
+
+limiter = AdaptiveLimiter()
+
+_buckets: Dict[Optional[str], TokenBucket] = {}
+_buckets_lock = threading.Lock()
+VALIDATED_NAMESPACE = "upstream.get_parsed"
+_counters = {
+    "requests": 0,
+    "retries": 0,
+    "failures": 0,
+    "throttled_seconds": 0.0,
+    "not_modified": 0,
+    "bytes_received": 0,
+    "parse_seconds": 0.0,
+}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str, amount: float = 1):
+    with _counters_lock:
+        _counters[name] += amount
+
+
+def _bucket(company: Optional[str]) -> TokenBucket:
+    with _buckets_lock:
+        try:
+            return _buckets[company]
+        except KeyError:
+            bucket = _buckets[company] = TokenBucket(COMPANY_RATE, COMPANY_BURST)
+            return bucket
+
+
+def _backoff(attempt: int, response: Optional[rq.Response]) -> float:
+    if response is not None:
+        try:
+            return min(BACKOFF_CAP, max(0.0, float(response.headers["Retry-After"])))
+        except (KeyError, ValueError):
+            pass
+
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt))
+
+
+def get(url: str, params: dict = None, headers: dict = None) -> rq.Response:
+    endpoint = urlsplit(url).path
+    # logins carry the company as a parameter instead of a header
+    bucket = _bucket((headers or {}).get("company") or (params or {}).get("company"))
+
+    for attempt in range(MAX_RETRIES + 1):
+        _count("throttled_seconds", bucket.acquire())
+        limiter.acquire()
+        _count("requests")
+        started = time.monotonic()
+        response = None
+        failed = True
+        try:
+            response = rq.get(
+                url, params=params, headers=headers, timeout=REQUEST_TIMEOUT
+            )
+        except (rq.ConnectionError, rq.Timeout):
+            _count("failures")
+            if attempt == MAX_RETRIES:
+                raise
+        except Exception:
+            _count("failures")
+            raise
+        else:
+            failed = response.status_code in RETRY_STATUSES
+            if not failed:
+                return response
+            _count("failures")
+            if attempt == MAX_RETRIES:
+                return response
+        finally:
+            limiter.release(endpoint, time.monotonic() - started, failed=failed)
+
+        _count("retries")
+        time.sleep(_backoff(attempt, response))
+
+
+def get_parsed(
+    url: str,
+    parse: Callable[[rq.Response], Any],
+    params: dict = None,
+    headers: dict = None,
+) -> Any:
+    """GETs ``url`` with HTTP validators and returns ``parse(response)``.
+
+    The parsed value of every 200 carrying an ETag or Last-Modified is kept
+    in ``cache_store``, under the same memory budget as the fetchers and
+    charged once with the fetcher entry that caches the same value, and a
+    304 answer to the following conditional request returns it without
+    downloading or parsing the body again.
+    """
+    headers = dict(headers or {})
+    key = (url, tuple(sorted((params or {}).items())), headers.get("company"))
+    cached = cache_store.get(VALIDATED_NAMESPACE, key)
+
+    headers["Accept-Encoding"] = ACCEPT_ENCODING
+    if cached is not None:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    response = get(url, params=params, headers=headers)
+    if response.status_code == 304 and cached is not None:
+        _count("not_modified")
+        return cached[2]
+
+    _count(
+        "bytes_received",
+        int(response.headers.get("Content-Length") or len(response.content)),
+    )
+    started = time.monotonic()
+    value = parse(response)
+    _count("parse_seconds", time.monotonic() - started)
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if response.status_code == 200 and (etag or last_modified):
+        cache_store.set(
+            VALIDATED_NAMESPACE,
+            key,
+            (etag, last_modified, value),
+            lambda: approximate_size(value),
+            shared=value,
+        )
+    else:
+        cache_store.pop(VALIDATED_NAMESPACE, key)
+
+    return value
+
+
+def upstream_stats() -> dict:
+    with _counters_lock:
+        counters = dict(_counters)
+
+    return {**counters, **limiter.stats(), "companies": len(_buckets)}
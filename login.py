@@ -1,7 +1,7 @@
 from time import sleep
 import streamlit as st
 
-from helpers.api import get_token
+from helpers.auth import sessions
 
 st.set_page_config(
     "dcommercial - DRE", layout="wide", initial_sidebar_state="collapsed"
@@ -24,13 +24,14 @@ company = st.text_input("Informe o ID da empresa")
 
 if username and password and company:
     try:
-        session_token, pseudonym = get_token(username, password, company)
+        session = sessions.login(username, password, company)
     except:
         st.error("Usuário/Senha ou o ID da empresa estão incorretos", icon="🚨")
     else:
         st.success("Logado com sucesso", icon="✅")
         sleep(1)
         st.session_state.company = company
-        st.session_state.session_token = session_token
-        st.session_state.pseudonym = pseudonym
+        st.session_state.session_token = session.token
+        st.session_state.pseudonym = session.pseudonym
+        st.session_state.session_key = session.key
         st.switch_page("pages/resumo.py")
@@ -8,4 +8,5 @@ class BaseSchema(BaseModel):
         populate_by_name=True,
         from_attributes=True,
         arbitrary_types_allowed=True,
+        defer_build=True,
     )
@@ -1,5 +1,8 @@
 from datetime import datetime
-from typing import List, Optional, Union
+from typing import List, Optional, Tuple, Union
+
+from pydantic import PrivateAttr
+
 from . import BaseSchema
 
 
@@ -23,14 +26,71 @@ class StockOuts(BaseSchema):
     total: float
 
 
+class _TableRef:
+    """Points a stock at the move table it was read from.
+
+    It reports no bytes of its own to ``approximate_size``: the table is
+    charged to the ``get_stocks`` cache entry, not to every stock list
+    holding it.
+    """
+
+    __slots__ = ("table",)
+    nbytes = 0
+
+    def __init__(self, table):
+        self.table = table
+
+
 class Stock(BaseSchema):
+    """A stock period and its moves.
+
+    ``entries`` and ``outs`` are either given when the stock is built or, for
+    stocks from ``Stock.from_table``, read on demand from the columnar table
+    so the moves are not held twice.
+    """
+
     id: int
     value: float
     start_date: datetime
     due_date: Optional[datetime] = None
     cogs: float
-    entries: StockEntries
-    outs: StockOuts
+    _entries: Optional[StockEntries] = PrivateAttr(None)
+    _outs: Optional[StockOuts] = PrivateAttr(None)
+    _table: Optional[_TableRef] = PrivateAttr(None)
+    _totals: Tuple[float, float] = PrivateAttr((0.0, 0.0))
+
+    def __init__(self, entries=None, outs=None, **data):
+        super().__init__(**data)
+        if entries is not None:
+            self._entries = StockEntries.model_validate(entries)
+        if outs is not None:
+            self._outs = StockOuts.model_validate(outs)
+
+    @classmethod
+    def from_table(cls, table, totals: Tuple[float, float], **data) -> "Stock":
+        stock = cls(**data)
+        stock._table = _TableRef(table)
+        stock._totals = totals
+
+        return stock
+
+    @property
+    def entries(self) -> Optional[StockEntries]:
+        if self._entries is None and self._table is not None:
+            return StockEntries(
+                moves=self._table.table.entries_of(self.id), total=self._totals[0]
+            )
+
+        return self._entries
+
+    @property
+    def outs(self) -> Optional[StockOuts]:
+        if self._outs is None and self._table is not None:
+            return StockOuts(
+                moves=self._table.table.outs_of(self.id), total=self._totals[1]
+            )
+
+        return self._outs
 
     @classmethod
     def parse_date(cls, done_str: Union[str, None]) -> Union[datetime, None]:
@@ -1,51 +1,19 @@
-from datetime import date
-import calendar
-import decimal
+from datetime import date, time
 from functools import lru_cache
-from typing import List
+import os
+import tempfile
 
-from requests import HTTPError
+from requests import HTTPError, RequestException
 from helpers.api import (
-    get_bills,
+    check_bills_access,
     get_customer_data,
-    get_payments,
-    get_sales,
     get_service_data,
-    get_stock_by_month,
-    rq,
-    base_url,
-    get_headers,
     get_stocks,
+    get_headers,
+    sessions,
 )
 from helpers import float_container
-from models.bills import Bills
-from models.enums import PaymentsMethods, ReferenceTable
-from models.payments import Payment
 import streamlit as st
-import plotly.express as px
-import pandas as pd
-import numpy as np
-
-from models.sales import Sale
-from models.stocks import Stock
-
-days = [
-    "1 - Segunda",
-    "2 - Terça",
-    "3 - Quarta",
-    "4 - Quinta",
-    "5 - Sexta",
-    "6 - Sábado",
-    "7 - Domingo",
-]
-
-periods = {
-    "manha": ((6, 0), (11, 59)),
-    "tarde": ((12, 0), (17, 59)),
-    "noite": ((18, 0), (23, 59)),
-    "madrugada": ((0, 0), (5, 59)),
-}
-# days = list(range(7))
 
 
 st.set_page_config(
@@ -63,6 +31,13 @@ else:
     st.session_state.session_token = st.query_params.session_token
     st.session_state.pseudonym = st.query_params.pseudonym
 
+if st.session_state.get("session_key"):
+    # picks up the token a reauthentication in another rerun obtained
+    session_token = sessions.token(st.session_state.session_key)
+    if session_token and session_token != st.session_state.session_token:
+        st.session_state.session_token = session_token
+        st.query_params.session_token = session_token
+
 st.header(st.query_params.pseudonym.upper())
 
 st.markdown(
@@ -77,72 +52,26 @@ st.markdown(
 )
 
 
-def get_faturamento_data(
-    payments: List[Payment],
-    sales: List[Sale],
-    stocks: List[Stock],
-    bills_to_pay: List[Bills],
-):
-    revenues: decimal = 0
-    discounts: decimal = 0
-    expenses: decimal = 0
-    cogs = 0
-    daily = {day: 0 for day in days}
-    by_period = {period: 0 for period in periods}
-    by_payment_methods = {payment: 0 for payment in PaymentsMethods.__members__}
-    for stock in stocks:
-        for move in stock.outs.moves:
-            if move.moment.date() >= month and move.moment.date() <= month.replace(
-                day=calendar.monthrange(month.year, month.month)[-1]
-            ):
-                cogs += move.value
-
-    for sale in sales:
-        for period in periods:
-            if (
-                sale.moment.hour >= periods[period][0][0]
-                and sale.moment.hour <= periods[period][1][0]
-            ):
-                by_period[period] += sale.value + sale.discount
-
-        daily[days[sale.moment.weekday()]] += sale.value + sale.discount
-
-    for payment in payments:
-        if payment.reference_table is ReferenceTable.SALES:
-            revenues += payment.value
-            try:
-                sale = [sale for sale in sales if sale.id == payment.reference_id][0]
-            except IndexError:
-                continue
-            revenues += sale.discount
-            discounts += sale.discount
-            by_payment_methods[payment.payment_method.name] += payment.value
-
-        if payment.reference_table is ReferenceTable.BILLS_TO_PAY:
-            for bill in bills_to_pay:
-                if (
-                    bill.id == payment.reference_id
-                    and bill.reference_table is not ReferenceTable.STOCK_ENTRIES
-                ):
-                    expenses += payment.value
-
-    return {
-        **{day: daily.get(day, 0) for day in [*days[1:], days[0]]},
-        "by_payment_methods": by_payment_methods,
-        "by_periods": by_period,
-        "receitas": revenues,
-        "despesas": expenses,
-        "descontos": discounts,
-        "cmv": cogs,
-        "vendas": len(sales),
-    }
+def reautenticar():
+    session_key = st.session_state.get("session_key")
+    if session_key and not st.session_state.get("reautenticado"):
+        try:
+            session_token = sessions.reauthenticate(session_key)
+        except RequestException:
+            session_token = None
+        if session_token:
+            st.session_state.reautenticado = True
+            st.rerun()
+    st.switch_page("login.py")
 
 
 headers = get_headers(st.session_state["company"], st.session_state["session_token"])
 
 try:
-    bills_to_pay = get_bills(headers)
+    check_bills_access(headers)
 except Exception as e:
+    if isinstance(e, HTTPError) and e.response.status_code == 401:
+        reautenticar()
     st.balloons()
     st.title("Faça o :blue[Upgrade]⬆️ do seu plano!")
     st.title("E garanta já essa e muitas outras funcionalidades! :sunglasses:")
@@ -153,12 +82,73 @@ except Exception as e:
         type="primary",
     )
 else:
-    months = [date(2024, month + 1, 1) for month in range(date.today().month)]
+    import numpy as np
+    import pandas as pd
+
+    from helpers.charts import area_chart, bar_chart, heatmap_chart, pie_chart
+    from helpers.dre import (
+        days,
+        get_month_customers,
+        get_month_faturamento,
+        get_month_fetched_at,
+        get_month_products,
+        get_month_services,
+        periods,
+    )
+    from helpers.ingest import follow
+    from helpers.ranking import shared_ranking
+
+    current_month = date.today().replace(day=1)
+    ultimo = current_month.year * 12 + current_month.month - 1
+    months = [
+        date(indice // 12, indice % 12 + 1, 1)
+        for indice in range(ultimo - 11, ultimo + 1)
+    ]
     report_months = st.multiselect(
         "", months, default=months[-1], placeholder="Selecione um mês de competência"
     )
 
     report_months.sort()
+
+    with st.expander("Períodos do dia"):
+        df_periodos = st.data_editor(
+            pd.DataFrame(
+                [
+                    {"período": name, "início": time(*start), "fim": time(*end)}
+                    for name, (start, end) in periods.items()
+                ]
+            ),
+            num_rows="dynamic",
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "início": st.column_config.TimeColumn(format="HH:mm", step=60),
+                "fim": st.column_config.TimeColumn(format="HH:mm", step=60),
+            },
+            key="periodos",
+        )
+        periodos, repetidos = {}, set()
+        for row in df_periodos.to_dict("records"):
+            if not all(
+                pd.notna(row[col]) and row[col] != "" for col in df_periodos.columns
+            ):
+                continue
+            if row["período"] in periodos:
+                repetidos.add(row["período"])
+                continue
+            periodos[row["período"]] = (
+                (row["início"].hour, row["início"].minute),
+                (row["fim"].hour, row["fim"].minute),
+            )
+        if repetidos:
+            st.warning(
+                f"Períodos repetidos: {', '.join(sorted(repetidos))}."
+                " Apenas a primeira definição de cada um é usada."
+            )
+    periodos = periodos or periods
+
+    if current_month in report_months:
+        follow(current_month, headers)
     ## Generate Data
 
     if report_months:
@@ -171,70 +161,25 @@ else:
             "faturamento": {
                 f"{month.strftime('%m/%y')}": {} for month in report_months
             },
-            "clientes": {f"{month.strftime('%m/%y')}": {} for month in report_months},
-            "produtos": {f"{month.strftime('%m/%y')}": {} for month in report_months},
-            "serviços": {f"{month.strftime('%m/%y')}": {} for month in report_months},
         }
 
-        def buscar_faturamento(month: date, headers: tuple):
-            payments = get_payments(month, headers)
-            sales = get_sales(
-                month,
-                headers,
-            )
-            stocks = get_stock_by_month(month, headers)
-            return get_faturamento_data(payments, sales, stocks, bills_to_pay)
-
-        def buscar_produtos(month: date, headers: tuple):
-            stocks = get_stock_by_month(month, headers)
-            resumo = {}
-
-            for stock in stocks:
-                for move in stock.outs.moves:
-                    if (
-                        move.moment.date() >= month
-                        and move.moment.date()
-                        <= month.replace(
-                            day=calendar.monthrange(month.year, month.month)[-1]
-                        )
-                    ):
-                        try:
-                            resumo[move.product_id] += move.amount
-                        except KeyError:
-                            resumo[move.product_id] = move.amount
-
-            return resumo
-
-        def buscar_servicos(month: date, headers: tuple):
-            sales = get_sales(month, headers)
-            resumo = {}
-
-            for sale in sales:
-                for service in sale.services.items():
-                    service_data = get_service_data(service[0], headers)
-                    try:
-                        resumo[service_data.name] += float(service[1])
-                    except KeyError:
-                        resumo[service_data.name] = float(service[1])
-
-            return resumo
+        report_labels = [month.strftime("%m/%y") for month in report_months]
+        rankings = {
+            nome: shared_ranking(dict(headers)["company"], nome, *report_labels)
+            for nome in ("clientes", "produtos", "serviços")
+        }
 
-        def buscar_fidelidade(month: date, headers: tuple) -> dict:
-            sales = get_sales(month, headers)
-            resumo = {}
+        def nome_cliente(customer_id: int) -> str:
+            return get_customer_data(customer_id, headers).get_full_name()
 
-            for sale in sales:
-                customer = get_customer_data(sale.customer, headers)
-                try:
-                    resumo[customer.get_full_name()] += sale.value
-                except KeyError:
-                    resumo[customer.get_full_name()] = sale.value
+        def nome_servico(service_id: int) -> str:
+            return get_service_data(service_id, headers).name
 
-            return resumo
+        by_weekday_hour = np.zeros((len(days), 24))
 
         try:
             for month in report_months:
-                faturamento_data = buscar_faturamento(month, headers)
+                faturamento_data = get_month_faturamento(month, headers, periodos)
                 total_vendas = faturamento_data.pop("vendas")
                 resume["faturamento"][month.strftime("%m/%y")] = {
                     "receitas": faturamento_data.pop("receitas"),
@@ -245,19 +190,21 @@ else:
                 resume["by_period"][month.strftime("%m/%y")] = faturamento_data.pop(
                     "by_periods"
                 )
+                by_weekday_hour += faturamento_data.pop("by_weekday_hour")
                 resume["by_payment_methods"][
                     month.strftime("%m/%y")
                 ] = faturamento_data.pop("by_payment_methods")
                 resume["daily"][month.strftime("%m/%y")] = faturamento_data
-                resume["clientes"][month.strftime("%m/%y")] = buscar_fidelidade(
-                    month, headers
-                )
-                resume["produtos"][month.strftime("%m/%y")] = buscar_produtos(
-                    month, headers
-                )
-                resume["serviços"][month.strftime("%m/%y")] = buscar_servicos(
-                    month, headers
-                )
+                for ranking, partials in (
+                    (rankings["clientes"], get_month_customers),
+                    (rankings["produtos"], get_month_products),
+                    (rankings["serviços"], get_month_services),
+                ):
+                    ranking.refresh_month(
+                        month.strftime("%m/%y"),
+                        partials.version(month, headers),
+                        lambda: partials(month, headers),
+                    )
 
             df_fat = pd.DataFrame(resume.pop("faturamento")).T
             df_fat.loc["acumulado"] = df_fat.select_dtypes(np.number).sum()
@@ -275,25 +222,11 @@ else:
             df_payment_methods.loc["acumulado"] = df_payment_methods.select_dtypes(
                 np.number
             ).sum()
-
-            df_clientes = pd.DataFrame(resume.pop("clientes"))
-            df_clientes.fillna(0, inplace=True)
-            df_clientes["acumulado"] = df_clientes.cumsum(axis=1).iloc[:, -1]
-            df_clientes = df_clientes.sort_values("acumulado", ascending=False)
-
-            df_produtos = pd.DataFrame(resume.pop("produtos"))
-            df_produtos.fillna(0, inplace=True)
-            df_produtos["acumulado"] = df_produtos.cumsum(axis=1).iloc[:, -1]
-            df_produtos = df_produtos.sort_values("acumulado", ascending=False)
-
-            df_servicos = pd.DataFrame(resume.pop("serviços"))
-            df_servicos.fillna(0, inplace=True)
-            df_servicos["acumulado"] = df_servicos.cumsum(axis=1).iloc[:, -1]
-            df_servicos = df_servicos.sort_values("acumulado", ascending=False)
         except HTTPError as e:
             if e.response.status_code == 401:
-                st.switch_page("login.py")
+                reautenticar()
             raise e
+        st.session_state.reautenticado = False
 
         despesas_admnistrativas = df_fat["despesas"]["acumulado"]
         custo_mercadoria_vendida = df_fat["cmv"]["acumulado"]
@@ -310,8 +243,16 @@ else:
         ) * 100
 
         # Visualize geral data
+        data_as_of = [
+            get_stocks.fetched_at(headers),
+            *[get_month_fetched_at(month, headers) for month in report_months],
+        ]
+        data_as_of = min((moment for moment in data_as_of if moment), default=None)
+
         with float_container.sticky_container(position="top", border=False):
             apenas_acumulado = st.toggle("Ver apenas o acumulado")
+            if data_as_of:
+                st.caption(f"Dados de {data_as_of.strftime('%d/%m/%Y %H:%M')}")
 
         with st.expander("Resumo Geral", expanded=True):
             c1, c2 = st.columns(2, gap="large")
@@ -330,15 +271,12 @@ else:
                         for col in df_fat.columns
                     },
                 )
-                c1.area_chart(
+                area_chart(
                     df_fat.transpose(),
-                    width=500,
-                    use_container_width=True,
                     y="acumulado" if apenas_acumulado else None,
                 )
-                c1.area_chart(
+                area_chart(
                     df_daily.transpose(),
-                    use_container_width=True,
                     y="acumulado" if apenas_acumulado else None,
                 )
                 c1.dataframe(
@@ -356,15 +294,13 @@ else:
                 )
 
                 c1.subheader("Vendas por período do dia")
-                c1.area_chart(
+                area_chart(
                     df_period.transpose(),
-                    use_container_width=True,
                     y="acumulado" if apenas_acumulado else None,
                 )
                 c1.subheader("Entradas por método de pagamento")
-                c1.area_chart(
+                area_chart(
                     df_payment_methods.transpose(),
-                    use_container_width=True,
                     y="acumulado" if apenas_acumulado else None,
                 )
             with c2:
@@ -441,29 +377,25 @@ else:
                         delta_color="inverse" if custo_ticket_delta > 30 else "normal",
                         help="Representa o gasto médio em despesas operacionais para realizar cada venda. É calculado dividindo as despesas operacionais pelo número total de vendas realizadas.",
                     )
-                fig = px.pie(
+                pie_chart(
                     df_daily.transpose(),
                     names=[day.split("-")[-1] for day in df_daily.columns],
                     values="acumulado",
                     title=f"Vendas por dia da semana",
+                    max_items=len(days),
                 )
-                c2.plotly_chart(fig, use_container_width=True)
-
-                fig = px.pie(
+                pie_chart(
                     df_period.transpose(),
                     names=[period for period in df_period.columns],
                     values="acumulado",
                     title=f"Vendas por período do dia",
                 )
-                c2.plotly_chart(fig, use_container_width=True)
-
-                fig = px.pie(
+                pie_chart(
                     df_payment_methods.transpose(),
                     names=[method for method in df_payment_methods.columns],
                     values="acumulado",
                     title=f"Entradas por método de pagamento",
                 )
-                c2.plotly_chart(fig, use_container_width=True)
             st.dataframe(
                 df_period,
                 column_config={
@@ -477,6 +409,18 @@ else:
                 },
                 use_container_width=True,
             )
+        with st.expander("Vendas por dia e horário"):
+            hours = [f"{hour:02d}h" for hour in range(24)]
+            heatmap_chart(
+                by_weekday_hour,
+                x=hours,
+                y=[day.split("-")[-1].strip() for day in days],
+                title="Vendas por dia da semana e hora",
+            )
+            st.subheader("Vendas por hora do dia")
+            bar_chart(
+                pd.DataFrame({"vendas": by_weekday_hour.sum(axis=0)}, index=hours)
+            )
         with st.expander("Resumo Fidelidade"):
             show_customers = st.slider(
                 "Visualizar o top:",
@@ -486,12 +430,16 @@ else:
                 key="customers",
             )
             st.subheader(f"TOP {show_customers} CLIENTES")
-            st.dataframe(df_clientes.head(show_customers))
-            st.bar_chart(
-                df_clientes.head(show_customers),
-                y="acumulado" if apenas_acumulado else None,
-                use_container_width=True,
-            )
+            try:
+                df_clientes = rankings["clientes"].frame(
+                    show_customers, report_labels, label=nome_cliente
+                )
+            except HTTPError as e:
+                if e.response.status_code == 401:
+                    reautenticar()
+                raise e
+            st.dataframe(df_clientes)
+            bar_chart(df_clientes, y="acumulado" if apenas_acumulado else None)
 
         with st.expander("Resumo Produtos e Serviços"):
             show_items = st.slider(
@@ -501,21 +449,56 @@ else:
                 value=10,
                 key="items",
             )
+            df_produtos = rankings["produtos"].frame(show_items, report_labels)
+            try:
+                df_servicos = rankings["serviços"].frame(
+                    show_items, report_labels, label=nome_servico
+                )
+            except HTTPError as e:
+                if e.response.status_code == 401:
+                    reautenticar()
+                raise e
             i_c1, i_c2 = st.columns(2)
             with i_c1:
                 i_c1.subheader(f"TOP {show_items} PRODUTOS MAIS VENDIDOS")
-                i_c1.dataframe(df_produtos.head(show_items))
-                i_c1.area_chart(
-                    df_produtos.head(show_items),
-                    y="acumulado" if apenas_acumulado else None,
-                    use_container_width=True,
-                )
+                i_c1.dataframe(df_produtos)
+                area_chart(df_produtos, y="acumulado" if apenas_acumulado else None)
 
             with i_c2:
                 i_c2.subheader(f"TOP {show_items} SERVIÇOS MAIS VENDIDOS")
-                i_c2.dataframe(df_servicos.head(show_items))
-                i_c2.area_chart(
-                    df_servicos.head(show_items),
-                    y="acumulado" if apenas_acumulado else None,
-                    use_container_width=True,
-                )
+                i_c2.dataframe(df_servicos)
+                area_chart(df_servicos, y="acumulado" if apenas_acumulado else None)
+
+        with st.expander("Exportar dados"):
+            from helpers.export import FORMATS, TABLES, export_table
+
+            e_c1, e_c2 = st.columns(2)
+            tabela = e_c1.selectbox("Tabela", list(TABLES), key="export_table")
+            formato = e_c2.selectbox("Formato", list(FORMATS), key="export_format")
+            if st.button("Gerar exportação", use_container_width=True):
+                with tempfile.TemporaryDirectory() as pasta:
+                    arquivo = os.path.join(pasta, f"{tabela}.{formato}")
+                    try:
+                        export_table(tabela, report_months, headers, formato, arquivo)
+                    except HTTPError as e:
+                        if e.response.status_code == 401:
+                            reautenticar()
+                        raise e
+                    except RuntimeError as e:
+                        st.error(str(e))
+                    else:
+                        with open(arquivo, "rb") as file:
+                            st.download_button(
+                                f"Baixar {tabela}.{formato}",
+                                data=file,
+                                file_name=f"{tabela}.{formato}",
+                                mime=FORMATS[formato],
+                                use_container_width=True,
+                                type="primary",
+                            )
+
+        if st.query_params.get("debug"):
+            with st.expander("Diagnóstico"):
+                from helpers.api import fetch_metrics
+
+                st.json(fetch_metrics())